@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+compile_config.py
+
+Command line tool checking config files before deploy, and writing a
+precompiled config loaded by main.setup() (no yaml parsing nor checks
+at instance start).
+
+All errors are reported (unknown keys, missing url, bad methods...),
+nothing is written if config is invalid.
+
+Usage:
+    compile_config.py [--output=config.compiled] [config.yaml ...]
+(first config file override others, can be include directories)
+"""
+
+import optparse
+import os
+import sys
+
+import yaml
+
+from utils.yamloptions import ConfigLayers
+from utils.configschema import validate
+from utils.routeplan import flatten_route
+from utils import compiledconfig
+
+# written in application directory, read by main.load_config
+COMPILED_FILE = 'config.compiled'
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage="%prog [options] [config.yaml|directory ...]")
+    parser.add_option('--default', default='config-default.yaml',
+                      help="default values (default config-default.yaml)")
+    parser.add_option('--output', default=COMPILED_FILE,
+                      help="compiled config (default %s)" % COMPILED_FILE)
+    parser.add_option('--check', action='store_true',
+                      help="only check config, write nothing")
+    (options, args) = parser.parse_args(argv)
+    yaml_list = args or ['config.yaml']
+
+    basedir = os.path.dirname(os.path.abspath(__file__))
+    # files, include directories and their defaults, merged
+    layers = ConfigLayers(yaml_list, options.default, basedir)
+    try:
+        layers.check()
+    except (ValueError, EnvironmentError, yaml.YAMLError), e:
+        print >> sys.stderr, e
+        print >> sys.stderr, "config not compiled"
+        return 1
+    routes = layers.options
+    config_default = layers.config_default
+
+    errors = validate(routes, config_default)
+    for error in errors:
+        print >> sys.stderr, error
+    if errors:
+        print >> sys.stderr, "%d errors, config not compiled" % len(errors)
+        return 1
+    if options.check:
+        print "%d routes ok" % len(routes)
+        return 0
+
+    flat = dict([(url, flatten_route(config_request, config_default))
+                 for (url, config_request) in routes.items()])
+    sources = compiledconfig.digests(layers.files(), basedir)
+    compiledconfig.save(os.path.join(basedir, options.output), flat, sources)
+    print "%d routes compiled in %s" % (len(routes), options.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,17 +6,38 @@ import wsgiref.handlers
 import os
 import sys
 import cgi
+import copy
 import traceback
+import time
 
 import webob
 
 from google.appengine.ext.webapp.util import run_wsgi_app
+from google.appengine.ext import db
+from google.appengine.runtime import apiproxy_errors
+try:
+    from google.appengine.api import taskqueue
+except ImportError:
+    from google.appengine.api.labs import taskqueue
 
 from utils.Chainmap import Chainmap
-from utils.yamloptions import YamlOptions
-from utils.urlforward import urlforward
+from utils.yamloptions import YamlOptions, ConfigLayers, get_config_from
+from utils import routedb
+from utils import routestore
+from utils import compiledconfig
+from utils.urlforward import urlforward, FetchError
+from utils import shadow
 from utils import server
 from utils import functional
+from utils import metrics
+from utils import deadletter
+from utils import delayed
+from utils import ordered
+from utils.admission import admission
+from utils.failover import health
+from utils.idempotency import IN_PROGRESS, IN_PROGRESS_RETRY_AFTER
+from utils import deadline
+from utils import watcher
 
 # ===================
 # = WSGIBaseHandler =
@@ -43,7 +64,16 @@ class WSGIBaseHandler(object):
         self._config = config
 
     def __call__(self, environ, start_response):
-        """Called by WSGI when a request comes in."""
+        """Called by WSGI when a request comes in.
+
+        Handler is shared by all requests : each request is handled by
+        a copy of it holding request and response (as webapp create a
+        RequestHandler by request)
+        """
+        return copy.copy(self).handle(environ, start_response)
+
+    def handle(self, environ, start_response):
+        """Handle a request, on a copy of handler (see __call__)"""
         self.request = webob.Request(environ)
         self.response = webob.Response()
 
@@ -104,13 +134,21 @@ class WSGIAppHandler(WSGIBaseHandler):
 
         request_url = self.request.path
 
-        if request_url not in self.request.config:
+        # lookup config for url (exact, then patterns)
+        (config_request, captures) = self.request.config.match(request_url)
+        if config_request is None:
             # TODO: error message page not found
             self.response.status = 403
             return False # exit : no config for this URL
 
-        # lookup config for url
-        self.request.config_request = self.request.config[request_url]
+        self.request.config_request = config_request
+        # path segments captured by pattern, for forward URL templates
+        self.request.captures = captures
+
+        # time budget given by caller (if any)
+        self.request.deadline = deadline.parse(
+            self.request.headers,
+            self.request.config_request.deadline_header)
 
         #continue next WSGI application
         return True
@@ -121,7 +159,9 @@ class WSGIAppHandler(WSGIBaseHandler):
 # =======================
 
 class WSGIAppHandlerDebug(WSGIAppHandler):
-    """Used when running in SDK for reloading config at each request"""
+    """Used when running in SDK for reloading config at each request
+    (only changed config files are parsed and compiled again)
+    """
 
     def __call__(self, environ, start_response):
         """Called by WSGI when a request comes in.
@@ -132,6 +172,57 @@ class WSGIAppHandlerDebug(WSGIAppHandler):
         return WSGIAppHandler.__call__(self, environ, start_response)
 
 
+# ========================
+# = WSGIAdmissionHandler =
+# ========================
+
+# environ key of route admitted by WSGIAdmissionHandler
+ADMITTED_KEY = 'forward.admitted'
+
+
+class WSGIAdmissionHandler(WSGIBaseHandler):
+    """Process request according of his config
+        - limit running requests (globally and for request URL)
+        - answer 503 when overloaded
+    """
+
+    def __call__(self, environ, start_response):
+        """Called by WSGI when a request comes in.
+        Release admitted request after next WSGI applications
+        """
+        # handler is shared by concurrent requests : admitted route is
+        # kept in request environ, never on self
+        try:
+            return WSGIBaseHandler.__call__(self, environ, start_response)
+        finally:
+            route = environ.pop(ADMITTED_KEY, None)
+            if route is not None:
+                admission.release(route)
+
+    def do_request(self):
+        """Handel request who have a config entry"""
+
+        # take config for request
+        config_request = self.request.config_request
+        route = config_request.url
+
+        timeout = None
+        if self.request.deadline:
+            timeout = self.request.deadline.remaining()
+
+        if not admission.acquire(route, config_request.max_inflight,
+                                 config_request.priority, timeout):
+            metrics.incr('admission.rejected')
+            self.response.status = 503
+            self.response.headers['Retry-After'] = str(admission.retry_after)
+            return False # exit : overloaded
+
+        self.request.environ[ADMITTED_KEY] = route
+
+        #continue next WSGI application
+        return True
+
+
 # =============================
 # = WSGIValidateMethodHandler =
 # =============================
@@ -150,7 +241,7 @@ class WSGIValidateMethodHandler(WSGIBaseHandler):
         request_method = self.request.method
 
         #validate request method
-        if request_method not in config_request['methods']:
+        if request_method not in config_request.methods:
             # TODO: error message 405
             self.response.status = 405
             return False # exit : not allowed request methode
@@ -175,9 +266,8 @@ class WSGIValidateRequestAddressHandler(WSGIBaseHandler):
         config_request = self.request.config_request
 
         #validate request method
-        if 'remote_addr' in config_request:
-            logging.info(config_request)
-            if self.request.remote_addr not in config_request['remote_addr']:
+        if config_request.remote_addr is not None:
+            if self.request.remote_addr not in config_request.remote_addr:
                 # TODO: error message 405
                 self.response.status = 405
                 return False # exit : not allowed remote address
@@ -193,6 +283,10 @@ class WSGIValidateRequestAddressHandler(WSGIBaseHandler):
 # = WSGIForwardsHandler =
 # =======================
 
+# errors queuing a forward (see WSGIForwardsHandler.defer)
+QUEUE_ERRORS = (taskqueue.Error, db.Error, apiproxy_errors.Error)
+
+
 class WSGIForwardsHandler(WSGIBaseHandler):
     """Process all forward defined in config
     """
@@ -203,64 +297,307 @@ class WSGIForwardsHandler(WSGIBaseHandler):
         # take config for request
         config_request = self.request.config_request
 
+        # answer resent request with recorded outcome
+        idempotency = config_request.idempotency
+        idempotency_key = None
+        if idempotency:
+            idempotency_key = idempotency.key(self.request)
+        if idempotency_key is not None:
+            # reserved until outcome is recorded
+            outcome = idempotency.reserve(idempotency_key)
+            if outcome == IN_PROGRESS:
+                # same request is forwarded right now
+                metrics.incr('idempotency.in_progress')
+                self.response.status = 409
+                self.response.headers['Retry-After'] = \
+                    str(IN_PROGRESS_RETRY_AFTER)
+                self.response.body = "Houps: same request in progress\n"
+                return True
+            if outcome:
+                metrics.incr('idempotency.replay')
+                (self.response.status, self.response.body) = outcome
+                self.response.headers['X-Idempotent-Replay'] = 'true'
+                return True
+
+        # forwards of route version (chosen by hash of caller)
+        forwards = config_request.forwards
+        version = None
+        if config_request.canary:
+            (version, forwards) = config_request.canary.choose(self.request)
+            metrics.incr('version.%s.requests' % version)
+
+        try:
+            response_code = self.do_forwards(config_request, forwards)
+        except:
+            if idempotency_key is not None:
+                idempotency.release(idempotency_key)
+            raise
+
+        # Send reponse to original request
+        self.response.status = response_code
+        if version is not None:
+            metrics.incr('version.%s.status.%d' % (version, response_code))
+
+        # remember outcome, unless sender should retry
+        if idempotency_key is not None:
+            if response_code < 500:
+                idempotency.put(idempotency_key, response_code,
+                                self.response.body)
+            else:
+                idempotency.release(idempotency_key)
+
+        #continue next WSGI application
+        return True
+
+    def do_forwards(self, config_request, forwards):
+        """Make all forwards of request, return response status code"""
+
         # variable to collect response
         response_code = 200
 
         # Make all forwarding
-        for config in config_request['forwards']:
+        for config in forwards:
+
+            # shadow forward, only for a sample of requests
+            if config.shadow and not shadow.sample(config.shadow_percent):
+                continue
 
             # use a dict to hold forwarded parameter
-            request_param = config['default'].copy()
+            request_param = config.default.copy()
             request_param.update(self.request.params)
 
             # get and filter param
-            param = {}
-            keys = set(request_param.keys()) - set(config['remove'])
-            if 'only' in config:
-                keys = keys & set(config['only'])
-            for key in keys:
-                # TODO Request::get(key) / Request::get_all(key) ?
-                param[key] = request_param.get(key)
-            param.update(config['set'])
-
-            # build forwarded request
-            fetch_opt = ["url",
-                                     "method",
-                                     "headers",
-                                     "follow_redirects",
-                                     "login",
-                                     "password"]
-
-            fetch_param = dict([(k, config[k]) for k in fetch_opt
-                                              if k in config])
-
-            status_code = urlforward(param=param, **fetch_param)
-
+            # TODO Request::get(key) / Request::get_all(key) ?
+            remove = config.remove
+            only = config.only
+            param = dict([(key, value)
+                          for (key, value) in request_param.iteritems()
+                          if key not in remove and
+                             (only is None or key in only)])
+            # 'set' values (can be secrets) are only added when sent :
+            # queued and dead letter param are stored without them
+            sent_param = param.copy()
+            sent_param.update(config.set)
+
+            # choose destination in pool (if any)
+            pool = config.pool
+            member = None
+            if pool:
+                # skip members failover know down
+                member = pool.choose(self.request.params,
+                                     lambda member: health.is_down(
+                                         member.url_template.template))
+                url_template = member.url_template
+            else:
+                url_template = config.url_template
+
+            # mirror request, never change response
+            if config.shadow:
+                self.start_shadow(config_request.url, config, url_template,
+                                  param)
+                continue
+
+            # deliver later (or in order of key), by task queue
+            order_key = None
+            if config.order_by:
+                order_key = self.request.params.get(config.order_by)
+            if order_key is not None or config.delay or config.batch_every:
+                try:
+                    if not self.defer(config_request.url, config,
+                                      url_template, param, order_key):
+                        # only this forward failed, sender may retry
+                        response_code = 503
+                except KeyError, e:
+                    self.response.body += "Houps: missing %s for %s\n" % \
+                                          (e, url_template)
+                    response_code = 400
+                continue
+
+            # try destination, then fallbacks (if any)
+            failover = config.failover
+            if failover:
+                destinations = failover.order(url_template)
+            else:
+                destinations = [url_template]
+
+            for url_template in destinations:
+                # skip forward if caller won't wait for it (a 0 urlfetch
+                # deadline is an error)
+                if self.request.deadline and \
+                   self.request.deadline.remaining() <= config.deadline_min:
+                    metrics.incr('deadline.skipped')
+                    self.response.body += "Houps: no time left for %s\n" % \
+                                          url_template
+                    status_code, url = 504, None
+                    break
+                if failover:
+                    failover.attempt(url_template)
+                # only pool member is counted in pool (failover can put
+                # it after fallbacks)
+                tried_member = None
+                if member is not None and \
+                   url_template is member.url_template:
+                    tried_member = member
+                try:
+                    status_code, url = self.forward(
+                        url_template, sent_param, config.fetch_param,
+                        pool, tried_member, self.request.deadline,
+                        config_request.deadline_header)
+                except KeyError, e:
+                    # fill forward URL template with request parameters
+                    self.response.body += "Houps: missing %s for %s\n" % \
+                                          (e, url_template)
+                    status_code, url = 400, None
+                    break
+                if not failover:
+                    break
+                failover.mark(url_template, status_code)
+                if not failover.failed(status_code):
+                    break
+                self.response.body += "Houps: %s for %s, failover\n" % \
+                                      (status_code or "error",
+                                       self.shown(url_template))
+
+            if url is None:
+                response_code = status_code
             # TODO better message formating (or more usefull)
-            if status_code == 200:
+            elif status_code == 200:
                 # HTTP OK result :)
-                self.response.body += "Send at %s\n" % config["url"]
+                self.response.body += "Send at %s\n" % \
+                                      self.shown(url_template)
             else:
                 # HTTP Error code :(
-                self.response.body += "Houps: %d for %s\n" % \
-                                      (status_code, config["url"])
+                self.response.body += "Houps: %s for %s\n" % \
+                                      (status_code or "error",
+                                       self.shown(url_template))
                 # forward (last) error code to sender
-                response_code = status_code
+                response_code = status_code or 502
+                # keep it for replay
+                if config.dead_letter:
+                    deadletter.record(config_request.url, config.index,
+                                      config.fingerprint, url,
+                                      config.method, param, status_code)
                 # TODO: factor login with response
                 # logging.error(response_txt)
 
         # End of all forwarding
+        return response_code
 
-        # Send reponse to original request
-        self.response.status = response_code
+    def forward(self, url_template, param, fetch_param, pool=None,
+                member=None, deadline=None, deadline_header=None):
+        """Forward request to one destination
 
-        #continue next WSGI application
+        Args:
+            url_template: UrlTemplate of destination
+            param: forwarded parameters
+            fetch_param: other urlforward arguments
+            pool, member: Pool and its chosen Member (if any)
+            deadline: Deadline of request (if any)
+            deadline_header: header propagating remaining time
+
+        Returns:
+            (status_code, url), status_code is None on connection error
+
+        Raises:
+            KeyError: if url_template need a missing request parameter
+        """
+        url = url_template.expand(self.request.captures,
+                                  self.request.params)
+
+        # give remaining time to destination
+        if deadline:
+            fetch_param = dict(fetch_param)
+            fetch_param['deadline'] = deadline.fetch_deadline()
+            if deadline_header:
+                fetch_param['headers'] = fetch_param['headers'] + \
+                                         (deadline.header(deadline_header), )
+
+        if member:
+            pool.acquire(member)
+        start = time.time()
+        try:
+            try:
+                return (urlforward(url=url, param=param, **fetch_param), url)
+            except FetchError, e:
+                logging.warning("forward to %s fail: %s",
+                                self.shown(url_template), e)
+                return (None, url)
+        finally:
+            if member:
+                pool.release(member, time.time() - start)
+
+    def shown(self, url_template):
+        """Destination URL shown in responses and logs, with secrets
+        masked (see utils.interpolation)
+        """
+        return url_template.expand_shown(self.request.captures,
+                                         self.request.params)
+
+    def start_shadow(self, route, config, url_template, param):
+        """Queue a shadow forward (see utils.shadow), its result only go
+        to metrics
+        """
+        # first dropped when load grows
+        if admission.overloaded():
+            metrics.incr('shadow.dropped')
+            return
+        try:
+            url = url_template.expand(self.request.captures,
+                                      self.request.params)
+        except KeyError:
+            metrics.incr('shadow.missing')
+            return
+        try:
+            shadow.defer(route, config.index, config.fingerprint,
+                         str(url_template), url, param)
+        except Exception, e:
+            metrics.incr('shadow.dropped')
+            logging.warning("shadow to %s not queued: %s",
+                            self.shown(url_template), e)
+
+    def defer(self, route, config, url_template, param, order_key=None):
+        """Queue a forward, delivered after previous ones with same
+        order_key (see utils.ordered) or delayed (see utils.delayed)
+
+        Returns:
+            False if not queued (task queue or datastore error), forward
+            is then stored as dead letter
+
+        Raises:
+            KeyError: if url_template need a missing request parameter
+        """
+        url = url_template.expand(self.request.captures,
+                                  self.request.params)
+        try:
+            if order_key is not None:
+                ordered.enqueue(route, config.index, config.fingerprint,
+                                order_key, url, param)
+                self.response.body += "Queued for %s\n" % \
+                                      self.shown(url_template)
+            else:
+                delayed.defer(route, config.index, config.fingerprint, url,
+                              param, config.delay, config.batch_every)
+                self.response.body += "Delayed for %s\n" % \
+                                      self.shown(url_template)
+        except QUEUE_ERRORS, e:
+            logging.warning("forward to %s not queued: %s",
+                            self.shown(url_template), e)
+            self.response.body += "Houps: not queued for %s\n" % \
+                                  self.shown(url_template)
+            if config.dead_letter:
+                deadletter.record(route, config.index, config.fingerprint,
+                                  url, config.method, param, None,
+                                  "not queued: %s" % e.__class__.__name__)
+            return False
         return True
 
 # ======================
 # = Launch application =
 # ======================
 
+# routes can also be added at runtime in datastore (see utils/routestore.py)
+DATASTORE_ROUTES = False
+
 # main WSGI application (WSGIAppHandler)
 global main_application
 main_application = None
@@ -269,23 +606,66 @@ main_application = None
 global list_application
 list_application = functional.foldr(lambda u, v: u(v), None,
         [
+            WSGIAdmissionHandler,
             WSGIValidateMethodHandler,
             WSGIValidateRequestAddressHandler,
             WSGIForwardsHandler,
         ])
 
 
-def setup():
-    """build and cache in global 'application' main WSGI application"""
+def load_config(platform=None):
+    """load YamlOptions from config files of application
+    (or CompiledOptions if compiled by compile_config.py,
+     or RouteDB if a route index is present,
+     or RouteStore if DATASTORE_ROUTES is set)
+
+    Args:
+        platform: 'local' for SDK config, default to server.platform()
+    """
+    if platform is None:
+        platform = server.platform()
+
+    basedir = os.path.dirname(os.path.abspath(__file__))
 
     yaml_list = ['config.yaml']
-    if server.platform() == 'local':
+    # include directory, with its own defaults (see ConfigLayers)
+    if os.path.isdir(os.path.join(basedir, 'config.d')):
+        yaml_list.append('config.d')
+    if platform == 'local':
         yaml_list.insert(0, 'config-test-local.yaml')
 
     yaml_default = 'config-default.yaml'
+    # built by utils/routedb.py, for a lot of routes
+    db_path = os.path.join(basedir, 'routes.db')
+    if routedb.sqlite3 is not None and os.path.exists(db_path):
+        return routedb.RouteDB(db_path)
+
+    # parsed config snapshots (kept if written before deploy)
+    cache_dir = os.path.join(basedir, 'config-cache')
+
+    # written by compile_config.py, not used in SDK (config files are
+    # edited there), source files are used once changed
+    config = None
+    if platform != 'local':
+        config = compiledconfig.load(
+            os.path.join(basedir, 'config.compiled'),
+            ConfigLayers(yaml_list, yaml_default, basedir).files(), basedir,
+            lambda previous: YamlOptions(yaml_list, yaml_default, basedir,
+                                         cache_dir, previous))
+    if config is None:
+        config = YamlOptions(yaml_list, yaml_default, basedir, cache_dir)
+
+    if DATASTORE_ROUTES:
+        # routes of config files first, then of datastore
+        config_default = get_config_from(yaml_default, basedir)['::dummy::']
+        return routestore.RouteStore(config_default, base=config)
+    return config
+
+
+def setup():
+    """build and cache in global 'application' main WSGI application"""
 
-    basedir = os.path.dirname(__file__)
-    config = YamlOptions(yaml_list, yaml_default, basedir)
+    config = load_config()
 
     global main_application
     global list_application
@@ -297,6 +677,8 @@ def setup():
     else:
         main_application = WSGIAppHandler(list_application,
                                                                  config=config)
+        # reload changed config files out of request path
+        watcher.start(config)
 
 
 def main():
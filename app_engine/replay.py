@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""
+replay.py
+
+Command line tool re-delivering failed forwards (see utils.deadletter),
+at a controlled rate and concurrency.
+
+Dead letters are read through remote_api (see app.yaml), headers,
+credentials and 'set' parameters of each forward are taken from local
+config, loaded as application does (see main.load_config). Dead letters
+of a forward whose destination changed since (other fingerprint) are
+skipped, and kept.
+App Engine SDK must be in PYTHONPATH.
+Delivered dead letters are deleted (unless --keep).
+
+Usage:
+    replay.py --app-id=my-app --route=/a_long_secret_url \\
+              --since=2009-03-01T12:00 --rate=50 --concurrency=10
+"""
+
+import datetime
+import getpass
+import logging
+import optparse
+import Queue
+import sys
+import threading
+import time
+import urllib2
+
+from google.appengine.ext.remote_api import remote_api_stub
+from google.appengine.ext import db
+
+import main as application
+from utils.deadletter import DeadLetter
+from utils.urlforward import encode_param
+
+# dead letters read by datastore query
+BATCH_SIZE = 500
+
+# seconds to wait for a destination
+TIMEOUT = 30
+
+
+def parse_time(value):
+    """Parse YYYY-MM-DD or YYYY-MM-DDTHH:MM"""
+    for format in ('%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime(*time.strptime(value, format)[:6])
+        except ValueError:
+            pass
+    raise optparse.OptionValueError("bad time %r" % value)
+
+
+def query_dead_letters(options):
+    """Yield dead letters matching options, by batch"""
+    query = DeadLetter.all()
+    if options.route:
+        query.filter('route =', options.route)
+    if options.destination:
+        query.filter('url =', options.destination)
+    if options.since:
+        query.filter('created >=', parse_time(options.since))
+    if options.until:
+        query.filter('created <', parse_time(options.until))
+    query.order('created')
+    count = 0
+    while True:
+        batch = query.fetch(BATCH_SIZE)
+        for dead_letter in batch:
+            yield dead_letter
+            count += 1
+            if options.limit and count >= options.limit:
+                return
+        if len(batch) < BATCH_SIZE:
+            return
+        query.with_cursor(query.cursor())
+
+
+class MethodRequest(urllib2.Request):
+    """urllib2 Request with any HTTP method"""
+
+    def __init__(self, method, *args, **kwargs):
+        urllib2.Request.__init__(self, *args, **kwargs)
+        self.method = method
+
+    def get_method(self):
+        return self.method
+
+
+def get_forward(dead_letter, config):
+    """Return forward config of a dead letter, None if config changed"""
+    if dead_letter.route not in config:
+        return None
+    forwards = config[dead_letter.route].forwards
+    if dead_letter.forward >= len(forwards):
+        return None
+    forward = forwards[dead_letter.forward]
+    if forward.fingerprint != dead_letter.fingerprint:
+        return None
+    return forward
+
+
+def deliver(dead_letter, forward, timeout=TIMEOUT):
+    """Re-deliver a dead letter with its forward config, return HTTP
+    status code
+    """
+    param = dict(dead_letter.param())
+    # not stored in dead letter (can be secrets)
+    param.update(forward.set)
+    payload = encode_param(param)
+    url = dead_letter.url
+    data = None
+    if dead_letter.method in ['POST', 'PUT']:
+        data = payload
+    elif payload:
+        url = url + ('&' if '?' in url else '?') + payload
+    request = MethodRequest(dead_letter.method, url, data,
+                            dict(forward.fetch_param['headers']))
+    try:
+        return urllib2.urlopen(request, timeout=timeout).code
+    except urllib2.HTTPError, e:
+        return e.code
+
+
+class Replayer(object):
+    """Deliver dead letters with worker threads, limited to rate / second"""
+
+    def __init__(self, config, options):
+        self.config = config
+        self.options = options
+        self.queue = Queue.Queue(options.concurrency * 2)
+        self.lock = threading.Lock()
+        self.delivered = []
+        self.counts = {'ok': 0, 'failed': 0, 'skipped': 0}
+
+    def run(self, dead_letters):
+        workers = [threading.Thread(target=self.work)
+                   for i in range(self.options.concurrency)]
+        for worker in workers:
+            worker.setDaemon(True)
+            worker.start()
+
+        interval = 1.0 / self.options.rate
+        next_time = time.time()
+        for dead_letter in dead_letters:
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            next_time = max(next_time, time.time() - 1) + interval
+            self.queue.put(dead_letter)
+
+        for worker in workers:
+            self.queue.put(None)
+        for worker in workers:
+            worker.join()
+        self.flush()
+        return self.counts
+
+    def work(self):
+        while True:
+            dead_letter = self.queue.get()
+            if dead_letter is None:
+                return
+            forward = get_forward(dead_letter, self.config)
+            if forward is None:
+                self.skip(dead_letter)
+                continue
+            try:
+                status_code = deliver(dead_letter, forward,
+                                      self.options.timeout)
+            except Exception, e:
+                logging.warning("replay of forward %d of %s fail: %s",
+                                dead_letter.forward, dead_letter.route, e)
+                status_code = None
+            self.done(dead_letter, status_code)
+
+    def skip(self, dead_letter):
+        """Keep a dead letter whose forward changed in config"""
+        self.lock.acquire()
+        try:
+            self.counts['skipped'] += 1
+            logging.warning("skip forward %d of %s: changed in config",
+                            dead_letter.forward, dead_letter.route)
+        finally:
+            self.lock.release()
+
+    def done(self, dead_letter, status_code):
+        self.lock.acquire()
+        try:
+            if status_code == 200:
+                self.counts['ok'] += 1
+                self.delivered.append(dead_letter.key())
+            else:
+                self.counts['failed'] += 1
+                logging.info("replay %s for forward %d of %s", status_code,
+                             dead_letter.forward, dead_letter.route)
+            if len(self.delivered) >= BATCH_SIZE:
+                self.flush()
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        """Delete delivered dead letters"""
+        delivered, self.delivered = self.delivered, []
+        if delivered and not self.options.keep:
+            db.delete(delivered)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage="%prog --app-id=APP_ID [options]")
+    parser.add_option('--app-id', help="App Engine application id")
+    parser.add_option('--host', help="default to APP_ID.appspot.com")
+    parser.add_option('--email', help="administrator email")
+    parser.add_option('--route', help="only for request URL")
+    parser.add_option('--destination', help="only for destination URL")
+    parser.add_option('--since', help="failed from YYYY-MM-DD[THH:MM]")
+    parser.add_option('--until', help="failed before YYYY-MM-DD[THH:MM]")
+    parser.add_option('--limit', type='int', default=0,
+                      help="max dead letters to replay")
+    parser.add_option('--rate', type='float', default=10.0,
+                      help="max requests by second (default 10)")
+    parser.add_option('--concurrency', type='int', default=4,
+                      help="parallel requests (default 4)")
+    parser.add_option('--timeout', type='float', default=TIMEOUT,
+                      help="seconds to wait for a destination "
+                           "(default %d)" % TIMEOUT)
+    parser.add_option('--keep', action='store_true',
+                      help="don't delete delivered dead letters")
+    parser.add_option('--dry-run', action='store_true',
+                      help="only list dead letters")
+    parser.add_option('--sdk', action='store_true',
+                      help="dead letters of SDK server "
+                           "(with config-test-local.yaml routes)")
+    (options, args) = parser.parse_args(argv)
+    if not options.app_id:
+        parser.error("--app-id is required")
+
+    logging.basicConfig(level=logging.INFO)
+
+    def auth_func():
+        email = options.email or raw_input("Email: ")
+        return (email, getpass.getpass("Password: "))
+
+    remote_api_stub.ConfigureRemoteDatastore(
+        options.app_id, '/remote_api', auth_func,
+        options.host or "%s.appspot.com" % options.app_id)
+
+    dead_letters = query_dead_letters(options)
+    if options.dry_run:
+        for dead_letter in dead_letters:
+            print "%s %s %s %s" % (dead_letter.created, dead_letter.status,
+                                   dead_letter.route, dead_letter.url)
+        return 0
+
+    # after remote_api setup : config can hold datastore routes
+    config = application.load_config(options.sdk and 'local' or None)
+    counts = Replayer(config, options).run(dead_letters)
+    print "replayed: %(ok)d ok, %(failed)d failed, " \
+          "%(skipped)d skipped (config changed)" % counts
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
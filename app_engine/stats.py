@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+stats.py
+
+Show in process counters (see utils.metrics) as plain text,
+ex: cache hit ratio and bytes saved, shadow forwards results.
+
+Counters are by instance, and reset when instance is restarted.
+"""
+
+from google.appengine.ext.webapp.util import run_wsgi_app
+
+from utils import metrics
+
+
+def stats_application(environ, start_response):
+    """WSGI application listing counters"""
+    counters = metrics.snapshot()
+    lines = ["%s: %s" % (name, counters[name]) for name in sorted(counters)]
+
+    # cache hit ratio
+    hits = counters.get('cache.hits', 0) + counters.get('cache.revalidated', 0)
+    total = hits + counters.get('cache.misses', 0)
+    if total:
+        lines.append("cache.hit_ratio: %.3f" % (float(hits) / total))
+
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['\n'.join(lines) + '\n']
+
+
+def main():
+    run_wsgi_app(stats_application)
+
+
+if __name__ == '__main__':
+    main()
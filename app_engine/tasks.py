@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+tasks.py
+
+Deliver forwards queued in task queue :
+ - /_tasks/forward : delayed forward (see utils.delayed)
+ - /_tasks/ordered : ordered forwards of a key (see utils.ordered)
+ - /_tasks/shadow : shadow forward, never retried (see utils.shadow)
+
+An error response make task queue retry the task later, after
+MAX_RETRY retries the forward is stored as dead letter.
+Logs give route and forward index, not destination URL (resolved, it can
+hold secrets, see utils.interpolation).
+
+Tasks hold route, forward index and fingerprint of forward destination
+(see routeplan.forward_fingerprint) : a task whose forward changed in
+config is dropped. Config is reloaded when changed, checked every
+RELOAD_INTERVAL seconds.
+"""
+
+import cgi
+import logging
+import time
+
+import webob
+
+from google.appengine.ext.webapp.util import run_wsgi_app
+
+import main
+from utils.urlforward import urlforward, FetchError
+from utils import deadletter
+from utils import ordered
+from utils import shadow
+
+# retries before giving up (and storing a dead letter)
+MAX_RETRY = 10
+
+# seconds between checks of config changes
+RELOAD_INTERVAL = 5.0
+
+# config cached by process, and time of its last check
+global config
+global checked
+config = None
+checked = 0
+
+
+def get_config(now=None):
+    """Return config, reloaded if changed since last check"""
+    global config
+    global checked
+    if now is None:
+        now = time.time()
+    if config is None:
+        config = main.load_config()
+        checked = now
+    elif now - checked >= RELOAD_INTERVAL:
+        checked = now
+        try:
+            config.reload()
+        except Exception, e:
+            # current config is kept
+            logging.error("invalid config not loaded: %s", e)
+    return config
+
+
+def get_forward(route, index, fingerprint):
+    """Return forward config, None if config changed (route or forward
+    removed, or forward with another fingerprint)
+    """
+    config = get_config()
+    if route not in config or index >= len(config[route].forwards):
+        return None
+    forward = config[route].forwards[index]
+    if forward.fingerprint != fingerprint:
+        return None
+    return forward
+
+
+def deliver(route, index, fingerprint, url, param):
+    """Forward param to url, with method, headers and 'set' parameters
+    of forward config
+
+    Returns:
+        True if delivered, or if retrying won't help (config changed)
+    """
+    forward = get_forward(route, index, fingerprint)
+    if forward is None:
+        logging.error("forward %d of %s changed, drop task", index, route)
+        return True
+    try:
+        status_code = urlforward(url=url, param=sent_param(forward, param),
+                                 **forward.fetch_param)
+    except FetchError, e:
+        logging.warning("queued forward %d of %s fail: %s", index, route, e)
+        return False
+    if status_code != 200:
+        logging.warning("queued forward %d of %s fail: %d",
+                        index, route, status_code)
+        return False
+    return True
+
+
+def sent_param(forward, param):
+    """Add 'set' parameters of forward config (never stored in tasks)"""
+    param = dict(param)
+    param.update(forward.set)
+    return param
+
+
+def give_up(route, index, fingerprint, url, param):
+    """Store as dead letter a forward failing too many times"""
+    forward = get_forward(route, index, fingerprint)
+    if forward is not None and forward.dead_letter:
+        deadletter.record(route, index, forward.fingerprint, url,
+                          forward.method, param, None,
+                          "failed %d times" % (MAX_RETRY + 1))
+
+
+def forward_task(request):
+    """Deliver a delayed forward, return False to retry"""
+    route = request.POST['route']
+    index = int(request.POST['forward'])
+    fingerprint = request.POST['fingerprint']
+    url = request.POST['url']
+    param = dict(cgi.parse_qsl(request.POST['payload'],
+                               keep_blank_values=True))
+    if deliver(route, index, fingerprint, url, param):
+        return True
+    if retry_count(request) < MAX_RETRY:
+        return False
+    give_up(route, index, fingerprint, url, param)
+    return True
+
+
+def ordered_task(request):
+    """Deliver events of a key in order, return False to retry"""
+    on_failure = None
+    if retry_count(request) >= MAX_RETRY:
+        # skip failing head event, so next events of key are delivered
+        on_failure = lambda route, index, event: \
+            give_up(route, index, event.fingerprint, event.url,
+                    dict(event.param()))
+    return ordered.drain(request.POST['partition'],
+                         lambda route, index, event:
+                             deliver(route, index, event.fingerprint,
+                                     event.url, dict(event.param())),
+                         on_failure)
+
+
+def shadow_task(request):
+    """Send a shadow forward, its result only go to metrics"""
+    route = request.POST['route']
+    index = int(request.POST['forward'])
+    url = request.POST['url']
+    param = dict(cgi.parse_qsl(request.POST['payload'],
+                               keep_blank_values=True))
+    forward = get_forward(route, index, request.POST['fingerprint'])
+    if forward is None:
+        logging.error("forward %d of %s changed, drop shadow %s",
+                      index, route, request.POST['name'])
+        return True
+    fetch_param = dict(forward.fetch_param)
+    fetch_param.pop('cache', None)
+    start = time.time()
+    try:
+        status_code = urlforward(url=url, param=sent_param(forward, param),
+                                 **fetch_param)
+    except FetchError, e:
+        logging.warning("shadow to %s fail: %s", request.POST['name'], e)
+        status_code = None
+    shadow.record(request.POST['name'], status_code, time.time() - start)
+    # never retried, even on error
+    return True
+
+
+def retry_count(request):
+    return int(request.headers.get('X-AppEngine-TaskRetryCount', 0))
+
+
+TASKS = {'/_tasks/forward': forward_task,
+         '/_tasks/ordered': ordered_task,
+         '/_tasks/shadow': shadow_task}
+
+
+def task_application(environ, start_response):
+    """WSGI application running a task"""
+    request = webob.Request(environ)
+    response = webob.Response()
+    if request.path not in TASKS:
+        response.status = 404
+    elif not TASKS[request.path](request):
+        # retried later by task queue
+        response.status = 500
+    return response(environ, start_response)
+
+
+def run():
+    run_wsgi_app(task_application)
+
+
+if __name__ == '__main__':
+    run()
@@ -31,3 +31,24 @@ class ChainmapTests(unittest.TestCase):
     def testMissKey(self):
         """raise KeyError if not found in any dict"""
         self.assertRaises(KeyError, Chainmap.__getitem__, self.cm, 'c')
+
+    def testGet(self):
+        """get take value in first dict, default if not found"""
+        self.assertEqual(self.cm.get('a'), 1)
+        self.assertEqual(self.cm.get('d'), 4)
+        self.assertEqual(self.cm.get('c', 5), 5)
+
+    def testKeys(self):
+        """keys of all dict, without duplicate"""
+        self.assertEqual(sorted(self.cm.keys()), ['a', 'b', 'd'])
+        self.assertEqual(sorted(self.cm), ['a', 'b', 'd'])
+        self.assertEqual(len(self.cm), 3)
+
+    def testSet(self):
+        """set and delete in first dict"""
+        self.cm['d'] = 5
+        self.assertEqual(self.d1['d'], 5)
+        self.assertEqual(self.d2['d'], 4)
+        del self.cm['d']
+        self.assertEqual(self.cm['d'], 4)
+
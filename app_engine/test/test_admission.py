@@ -0,0 +1,47 @@
+from utils.admission import Admission
+import threading
+import unittest
+
+
+class AdmissionTests(unittest.TestCase):
+
+    def testGlobalLimit(self):
+        """reject when capacity is full"""
+        admission = Admission(max_inflight=2, queue_timeout=0)
+        self.assert_(admission.acquire('/a', priority='high'))
+        self.assert_(admission.acquire('/b', priority='high'))
+        self.failIf(admission.acquire('/c', priority='high'))
+        admission.release('/a')
+        self.assert_(admission.acquire('/c', priority='high'))
+
+    def testPriority(self):
+        """low priority routes are rejected first"""
+        admission = Admission(max_inflight=10, queue_timeout=0)
+        for i in range(5):
+            self.assert_(admission.acquire('/a', priority='normal'))
+        self.failIf(admission.acquire('/low', priority='low'))
+        self.assert_(admission.acquire('/a', priority='normal'))
+        self.assert_(admission.overloaded())
+
+    def testRouteLimit(self):
+        """reject when route limit is reached"""
+        admission = Admission(max_inflight=10, queue_timeout=0)
+        self.assert_(admission.acquire('/a', 1))
+        self.failIf(admission.acquire('/a', 1))
+        self.assert_(admission.acquire('/b', 1))
+
+    def testQueue(self):
+        """waiting request run when a running one end"""
+        admission = Admission(max_inflight=1, queue_timeout=5)
+        self.assert_(admission.acquire('/a', priority='high'))
+        timer = threading.Timer(0.05, admission.release, ['/a'])
+        timer.start()
+        self.assert_(admission.acquire('/b', priority='high'))
+        self.assertEqual(admission.inflight, 1)
+
+    def testQueueTimeout(self):
+        """waiting request is rejected after timeout"""
+        admission = Admission(max_inflight=1, queue_timeout=0.01)
+        self.assert_(admission.acquire('/a', priority='high'))
+        self.failIf(admission.acquire('/b', priority='high'))
+        self.assertEqual(admission.queued, 0)
@@ -0,0 +1,48 @@
+from utils.canary import Canary
+import unittest
+
+
+class DummyRequest(object):
+
+    def __init__(self, headers={}, params={}, remote_addr=None):
+        self.headers = headers
+        self.params = params
+        self.remote_addr = remote_addr
+
+
+class CanaryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.canary = Canary('X-Customer', [('stable', 90, ('a', )),
+                                            ('canary', 10, ('b', ))])
+
+    def testDeterministic(self):
+        """same key, same version"""
+        version = self.canary.version('customer-1')
+        for i in xrange(10):
+            self.assertEqual(self.canary.version('customer-1'), version)
+
+    def testWeights(self):
+        counts = {'stable': 0, 'canary': 0}
+        for i in xrange(10000):
+            counts[self.canary.version('customer-%d' % i)[0]] += 1
+        self.assert_(8500 < counts['stable'] < 9500, counts)
+
+    def testNoWeight(self):
+        """version with no weight is never chosen"""
+        canary = Canary(None, [('old', 0, ('a', )), ('new', 1, ('b', ))])
+        for i in xrange(100):
+            self.assertEqual(canary.version(str(i)), ('new', ('b', )))
+        self.assertRaises(ValueError, Canary, None, [('old', 0, ())])
+
+    def testChoose(self):
+        """header, then parameter, then remote address"""
+        self.assertEqual(
+            self.canary.choose(DummyRequest(headers={'X-Customer': 'c1'})),
+            self.canary.version('c1'))
+        self.assertEqual(
+            self.canary.choose(DummyRequest(params={'X-Customer': 'c2'})),
+            self.canary.version('c2'))
+        self.assertEqual(
+            self.canary.choose(DummyRequest(remote_addr='10.0.0.1')),
+            self.canary.version('10.0.0.1'))
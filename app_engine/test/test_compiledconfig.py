@@ -0,0 +1,95 @@
+from utils import compiledconfig
+import os
+import shutil
+import tempfile
+import unittest
+
+ROUTES = {'/a': {'url': '/a',
+                 'methods': ['GET'],
+                 'forwards': [{'url': "http://example.com/a",
+                               'method': 'GET'}]}}
+
+
+class DummyOptions(dict):
+
+    def __init__(self, data):
+        dict.__init__(self, data)
+        self.data = data
+
+    def reload(self):
+        return False
+
+    def paths(self):
+        return ['dummy.yaml']
+
+
+class CompiledConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.base_dir, 'config.compiled')
+        self.write_source("- url: /a\n")
+        compiledconfig.save(self.path, ROUTES, self.digests())
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def write_source(self, content):
+        source = open(os.path.join(self.base_dir, 'config.yaml'), 'w')
+        try:
+            source.write(content)
+        finally:
+            source.close()
+
+    def digests(self):
+        return compiledconfig.digests(['config.yaml'], self.base_dir)
+
+    def testLoad(self):
+        config = compiledconfig.load(self.path, ['config.yaml'],
+                                     self.base_dir)
+        self.assertEqual(config.keys(), ['/a'])
+        self.assertEqual(config.match('/a')[0].forwards[0].method, 'GET')
+
+    def testSourceChanged(self):
+        """compiled config is not used if source changed"""
+        self.write_source("- url: /b\n")
+        self.assertEqual(compiledconfig.load(self.path, ['config.yaml'],
+                                             self.base_dir), None)
+
+    def testOtherSources(self):
+        self.assertEqual(compiledconfig.load(self.path,
+                                             ['config.yaml', 'other.yaml'],
+                                             self.base_dir), None)
+
+    def testAbsent(self):
+        self.assertEqual(compiledconfig.load(self.path + '.absent',
+                                             ['config.yaml'],
+                                             self.base_dir), None)
+
+    def testPaths(self):
+        config = compiledconfig.load(self.path, ['config.yaml'],
+                                     self.base_dir)
+        self.assertEqual(config.paths(),
+                         [os.path.join(self.base_dir, 'config.yaml')])
+
+    def testReloadUnchanged(self):
+        config = compiledconfig.load(self.path, ['config.yaml'],
+                                     self.base_dir, self.fail)
+        self.assertEqual(config.reload(), False)
+
+    def testReloadChanged(self):
+        """source changed after load : config is loaded from sources"""
+        loaded = []
+        def fallback(previous):
+            loaded.append(previous)
+            return DummyOptions({'/b': None})
+        config = compiledconfig.load(self.path, ['config.yaml'],
+                                     self.base_dir, fallback)
+        routes = config.data
+        self.write_source("- url: /b\n")
+        os.utime(os.path.join(self.base_dir, 'config.yaml'), (1, 1))
+        self.assertEqual(config.reload(), True)
+        self.assertEqual(loaded, [routes])
+        self.assertEqual(config.keys(), ['/b'])
+        self.assertEqual(config.paths(), ['dummy.yaml'])
+        self.assertEqual(config.reload(), False)
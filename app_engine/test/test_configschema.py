@@ -0,0 +1,50 @@
+from utils.configschema import validate
+from utils.routeplan import flatten_route
+import unittest
+
+CONFIG_DEFAULT = {'url': "::dummy::",
+                  'methods': ["GET", "POST"],
+                  'forwards': [{'method': "POST", 'remove': []}]}
+
+
+class ValidateTests(unittest.TestCase):
+
+    def testValid(self):
+        self.assertEqual(validate({'/a': {
+            'url': '/a',
+            'forwards': [{'url': "http://example.com/{tenant}"}]}},
+            CONFIG_DEFAULT), [])
+
+    def testAllErrors(self):
+        """all errors are reported"""
+        errors = validate({
+            '/a': {'url': '/a',
+                   'methods': ['GET', 'PSOT'],
+                   'forwards': [{'method': 'GET', 'remvoe': ['a']}]},
+            '/b': {'url': '/b',
+                   'forwards': [{'url': "http://example.com/",
+                                 'remove': 'a'}]}},
+            CONFIG_DEFAULT)
+        self.assertEqual(errors, [
+            "route /a: unknown method 'PSOT'",
+            "route /a, forward 0: unknown key 'remvoe'",
+            "route /a, forward 0: missing url (or pool)",
+            "route /b, forward 0: bad type for 'remove': 'a'"])
+
+    def testCompileError(self):
+        """errors found by compiling are reported"""
+        errors = validate({'/a': {
+            'url': '/a',
+            'forwards': [{'url': "http://example.com/{tenant"}]}},
+            CONFIG_DEFAULT)
+        self.assertEqual(len(errors), 1)
+        self.assert_(errors[0].startswith("route /a: ValueError"))
+
+    def testFlatten(self):
+        flat = flatten_route({'url': '/a',
+                              'forwards': [{'url': "http://example.com/"}]},
+                             CONFIG_DEFAULT)
+        self.assertEqual(flat['methods'], ["GET", "POST"])
+        self.assertEqual(flat['forwards'], [{'url': "http://example.com/",
+                                             'method': "POST",
+                                             'remove': []}])
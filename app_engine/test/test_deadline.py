@@ -0,0 +1,40 @@
+from utils import deadline
+import unittest
+
+
+class DeadlineTests(unittest.TestCase):
+
+    def testParse(self):
+        """timeout header give remaining time"""
+        request_deadline = deadline.parse({'X-Request-Timeout': '2.5'},
+                                          'X-Request-Timeout', now=100)
+        self.assertEqual(request_deadline.remaining(now=101), 1.5)
+        self.assertEqual(request_deadline.remaining(now=103), 0)
+        self.assertEqual(request_deadline.header('X-Request-Timeout',
+                                                 now=102),
+                         ('X-Request-Timeout', '0.500'))
+
+    def testNoDeadline(self):
+        """absent or invalid header give no deadline"""
+        self.assertEqual(deadline.parse({}, 'X-Request-Timeout'), None)
+        self.assertEqual(deadline.parse({'X-Request-Timeout': '2'}, None),
+                         None)
+        self.assertEqual(deadline.parse({'X-Request-Timeout': 'soon'},
+                                        'X-Request-Timeout'), None)
+        self.assertEqual(deadline.parse({'X-Request-Timeout': '-1'},
+                                        'X-Request-Timeout'), None)
+        self.assertEqual(deadline.parse({'X-Request-Timeout': 'nan'},
+                                        'X-Request-Timeout'), None)
+        self.assertEqual(deadline.parse({'X-Request-Timeout': 'inf'},
+                                        'X-Request-Timeout'), None)
+
+    def testFetchDeadline(self):
+        """urlfetch deadline is capped"""
+        request_deadline = deadline.parse({'X-Request-Timeout': '3600'},
+                                          'X-Request-Timeout', now=100)
+        self.assertEqual(request_deadline.fetch_deadline(now=100),
+                         deadline.FETCH_MAX_DEADLINE)
+        self.assertEqual(request_deadline.fetch_deadline(now=3698), 2)
+        self.assertEqual(request_deadline.header('X-Request-Timeout',
+                                                 now=100),
+                         ('X-Request-Timeout', '10.000'))
@@ -0,0 +1,15 @@
+from utils.delayed import eta
+import unittest
+
+
+class EtaTests(unittest.TestCase):
+
+    def testDelay(self):
+        """deliver after delay"""
+        self.assertEqual(eta(30, now=1000), 1030)
+
+    def testBatchEvery(self):
+        """deliver at next multiple"""
+        self.assertEqual(eta(0, 60, now=1000), 1020)
+        self.assertEqual(eta(0, 60, now=1020), 1080)
+        self.assertEqual(eta(30, 60, now=1000), 1080)
@@ -0,0 +1,62 @@
+from utils.failover import Failover, health
+from utils.urltemplate import UrlTemplate
+import unittest
+
+
+class FailoverTests(unittest.TestCase):
+
+    def setUp(self):
+        health.clear()
+        self.primary = UrlTemplate("http://a.example.com/hooks")
+        self.failover = Failover(["http://b.example.com/hooks",
+                                  "http://c.example.com/hooks"],
+                                 status=[503], delay=30)
+
+    def order(self, now):
+        return [url_template.template
+                for url_template in self.failover.order(self.primary, now)]
+
+    def testOrder(self):
+        """primary then fallbacks"""
+        self.assertEqual(self.order(0), ["http://a.example.com/hooks",
+                                         "http://b.example.com/hooks",
+                                         "http://c.example.com/hooks"])
+
+    def testFailed(self):
+        """connection error and configured status trigger failover"""
+        self.assert_(self.failover.failed(None))
+        self.assert_(self.failover.failed(503))
+        self.failIf(self.failover.failed(200))
+        self.failIf(self.failover.failed(500))
+
+    def testSkipDown(self):
+        """known down destination is tried last, until retry delay"""
+        health.mark_down(self.primary.template, 30, now=0)
+        self.assertEqual(self.order(10)[-1], "http://a.example.com/hooks")
+        # probe once after delay
+        self.assertEqual(self.order(31)[0], "http://a.example.com/hooks")
+        self.failover.attempt(self.primary, now=31)
+        self.assertEqual(self.order(32)[-1], "http://a.example.com/hooks")
+
+    def testProbeDelay(self):
+        """probe window is re-armed with failover delay"""
+        failover = Failover([], delay=5)
+        health.mark_down(self.primary.template, 5, now=0)
+        failover.attempt(self.primary, now=6)
+        self.failUnless(health.is_down(self.primary.template, now=10))
+        self.failIf(health.is_down(self.primary.template, now=11))
+
+    def testOrderDontProbe(self):
+        """ordering don't use probe window of fallbacks not tried"""
+        fallback = self.failover.fallbacks[0]
+        health.mark_down(fallback.template, 30, now=0)
+        self.order(31)
+        self.order(32)
+        self.failIf(health.is_down(fallback.template, now=33))
+
+    def testMarkUp(self):
+        """success of probe restore destination"""
+        self.failover.mark(self.primary, None)
+        self.assertEqual(self.order(None)[-1], "http://a.example.com/hooks")
+        self.failover.mark(self.primary, 200)
+        self.assertEqual(self.order(None)[0], "http://a.example.com/hooks")
@@ -0,0 +1,77 @@
+from google.appengine.ext import testbed
+from utils.idempotency import Idempotency, IN_PROGRESS
+import unittest
+
+
+class DummyRequest(object):
+
+    def __init__(self, headers={}, params={}):
+        self.headers = headers
+        self.params = params
+
+
+class IdempotencyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.idempotency = Idempotency('X-Delivery-Id')
+
+    def testKeyFromHeader(self):
+        """key is taken in header first"""
+        request = DummyRequest({'X-Delivery-Id': 'h1'},
+                               {'X-Delivery-Id': 'p1'})
+        self.assertEqual(self.idempotency.key(request), 'h1')
+
+    def testKeyFromParam(self):
+        """then in request parameter"""
+        request = DummyRequest({}, {'X-Delivery-Id': u'p1'})
+        self.assertEqual(self.idempotency.key(request), 'p1')
+
+    def testNoKey(self):
+        self.assertEqual(self.idempotency.key(DummyRequest()), None)
+
+    def testOutcome(self):
+        """recorded outcome is returned for same key"""
+        self.assertEqual(self.idempotency.get('k1'), None)
+        self.idempotency.put('k1', 200, "Send at http://example.com\n")
+        self.assertEqual(self.idempotency.get('k1'),
+                         (200, "Send at http://example.com\n"))
+        self.assertEqual(self.idempotency.get('k2'), None)
+
+    def testInvalidStore(self):
+        self.assertRaises(ValueError, Idempotency, 'X-Delivery-Id', 'disk')
+
+    def testReserve(self):
+        """resent request is not forwarded while first one is"""
+        self.assertEqual(self.idempotency.reserve('k1'), None)
+        self.assertEqual(self.idempotency.reserve('k1'), IN_PROGRESS)
+        self.idempotency.put('k1', 200, "ok")
+        self.assertEqual(self.idempotency.reserve('k1'), (200, "ok"))
+
+    def testRelease(self):
+        """released key can be forwarded again"""
+        self.assertEqual(self.idempotency.reserve('k1'), None)
+        self.idempotency.release('k1')
+        self.assertEqual(self.idempotency.reserve('k1'), None)
+
+
+class MemcacheStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def testRoutes(self):
+        """same key on other route is not replayed"""
+        route_a = Idempotency('X-Delivery-Id', 'memcache', route='/a')
+        route_b = Idempotency('X-Delivery-Id', 'memcache', route='/b')
+        self.assertEqual(route_a.reserve('k1'), None)
+        route_a.put('k1', 200, "ok")
+        self.assertEqual(route_b.get('k1'), None)
+        self.assertEqual(route_b.reserve('k1'), None)
+        self.assertEqual(route_b.reserve('k1'), IN_PROGRESS)
+        route_b.release('k1')
+        self.assertEqual(route_a.get('k1'), (200, "ok"))
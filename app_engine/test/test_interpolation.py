@@ -0,0 +1,80 @@
+from utils.interpolation import Interpolator, mask
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class InterpolatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.write('secret.txt', "s3cret\n")
+        self.interpolator = Interpolator(self.base_dir,
+                                         {'FTP_USER': "anUser"})
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def write(self, name, content, mtime=None):
+        path = os.path.join(self.base_dir, name)
+        f = open(path, 'w')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def testEnviron(self):
+        self.assertEqual(self.interpolator.resolve(
+            {'set': {'ftplogin': "${FTP_USER}", 'count': 1}}),
+            {'set': {'ftplogin': "anUser", 'count': 1}})
+
+    def testFile(self):
+        self.assertEqual(self.interpolator.resolve(
+            ["login:${file:secret.txt}"]), ["login:s3cret"])
+
+    def testEscape(self):
+        self.assertEqual(self.interpolator.resolve("$${FTP_USER}"),
+                         "${FTP_USER}")
+
+    def testMask(self):
+        """references are masked, not resolved"""
+        self.assertEqual(mask({'url': ["http://a/${file:secret.txt}/$${b}"],
+                               'count': 1}),
+                         {'url': ["http://a/***/${b}"], 'count': 1})
+
+    def testUndefined(self):
+        """error give reference, not secret"""
+        try:
+            self.interpolator.resolve("${FTP_PASSWORD}")
+        except ValueError, e:
+            self.assertEqual(str(e),
+                             "undefined environment variable FTP_PASSWORD")
+        else:
+            self.fail("no error")
+        self.assertRaises(ValueError, self.interpolator.resolve,
+                          "${file:missing.txt}")
+
+    def testChanged(self):
+        """secret file is read again when changed"""
+        self.interpolator.resolve("${file:secret.txt}")
+        self.assertEqual(self.interpolator.changed(), False)
+        self.write('secret.txt', "other\n", mtime=1)
+        self.assertEqual(self.interpolator.changed(), True)
+        self.assertEqual(self.interpolator.resolve("${file:secret.txt}"),
+                         "other")
+        self.assertEqual(self.interpolator.changed(), False)
+
+    def testForgotten(self):
+        """file no more referenced is no more watched"""
+        self.write('other.txt', "old\n")
+        self.interpolator.begin()
+        self.interpolator.resolve(["${file:secret.txt}", "${file:other.txt}"])
+        self.interpolator.end()
+        self.interpolator.begin()
+        self.interpolator.resolve("${file:secret.txt}")
+        self.interpolator.end()
+        self.write('other.txt', "new\n", mtime=1)
+        self.assertEqual(self.interpolator.changed(), False)
@@ -0,0 +1,64 @@
+from utils.lrucache import LRUCache
+import unittest
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(max_items=3)
+        for key in 'abc':
+            self.cache.set(key, key.upper())
+
+    def testFound(self):
+        """Test element lookup"""
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.assert_('b' in self.cache)
+        self.assert_('d' not in self.cache)
+        self.assertEqual(self.cache.get('d', 'default'), 'default')
+
+    def testEvictLeastRecentlyUsed(self):
+        """oldest not used item is evicted when full"""
+        self.cache.get('a')
+        self.cache.set('d', 'D')
+        self.assertEqual(len(self.cache), 3)
+        self.assert_('b' not in self.cache)
+        self.assert_('a' in self.cache)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def testReplace(self):
+        """set existing key replace value"""
+        self.cache.set('a', 'new')
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.get('a'), 'new')
+
+    def testTtl(self):
+        """item expire after ttl"""
+        self.cache.set('t', 'T', ttl=10, now=100)
+        self.assertEqual(self.cache.get('t', now=105), 'T')
+        self.assertEqual(self.cache.get('t', now=110), None)
+        self.assertEqual(len(self.cache), 2)
+
+    def testMaxSize(self):
+        """sum of item size is bounded"""
+        cache = LRUCache(max_items=10, max_size=10)
+        cache.set('a', 'A', size=6)
+        cache.set('b', 'B', size=6)
+        self.assert_('a' not in cache)
+        self.assertEqual(cache.size, 6)
+        cache.set('c', 'C', size=11)
+        self.assert_('c' not in cache)
+
+    def testStats(self):
+        """hits and misses are counted"""
+        self.cache.get('a')
+        self.cache.get('z')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def testPopClear(self):
+        self.assertEqual(self.cache.pop('a'), 'A')
+        self.assertEqual(self.cache.pop('a'), None)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.cache.set('e', 'E')
+        self.assertEqual(self.cache.get('e'), 'E')
@@ -1,3 +1,4 @@
+import os
 import unittest
 
 from utils.webtest import TestApp
@@ -5,6 +6,7 @@ from utils.mocker import *
 
 import main
 from main import WSGIAppHandler, list_application
+from utils.routeplan import compile_routes
 
 
 class DummyYamlOptions(dict):
@@ -32,8 +34,11 @@ class TestHelper(unittest.TestCase):
         self.mocker.replay()
 
     def setUp(self):
+        # compile routes, as YamlOptions do
+        self.config = config = compile_routes(self.get_config(),
+                                              {'forwards': [{}]})
         self.app = TestApp(WSGIAppHandler(list_application,
-                                          config=self.get_config(),
+                                          config=config,
                                           debug=True))
 
         self.mocker = Mocker()
@@ -430,3 +435,249 @@ class ValidTestRemoteAddress(TestHelper, TestMixin):
         response = self.app.get('/request_url', expect_errors=True,
                                 extra_environ={"REMOTE_ADDR": "127.6.6.6"})
         self.assertEqual('405 Method Not Allowed', response.status)
+
+
+class PatternTestRoute(TestHelper):
+    """Test routes with {name} segments"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks/{tenant}": {
+                'url': "/hooks/{tenant}",
+                'methods': ["GET"],
+                'forwards': [
+                    {'url': "http://example.com/{tenant}/hooks.php",
+                     'method': "GET"},
+                ]
+            }
+        })
+
+    def test_captured_segment(self):
+        """Check that captured segment fill forward URL"""
+        self.mock_forward(200, url="http://example.com/acme/hooks.php")
+        response = self.app.get('/hooks/acme')
+        self.assertEqual('200 OK', response.status)
+
+    def test_no_route(self):
+        """Check that other path are not forwarded"""
+        self.mock_not_forward()
+        response = self.app.get('/hooks/acme/other', expect_errors=True)
+        self.assertEqual('403 Forbidden', response.status)
+
+
+class SecretTestShownUrl(TestHelper):
+    """Test forward URL with a secret"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks": {
+                'url': "/hooks",
+                'methods': ["GET"],
+                'forwards': [
+                    {'url': "http://example.com/${HOOKS_TOKEN}/hooks.php",
+                     'method': "GET"},
+                ]
+            }
+        })
+
+    def setUp(self):
+        os.environ['HOOKS_TOKEN'] = "s3cret"
+        TestHelper.setUp(self)
+
+    def tearDown(self):
+        del os.environ['HOOKS_TOKEN']
+        TestHelper.tearDown(self)
+
+    def test_secret_masked(self):
+        """Check that secret is sent, but not shown in response"""
+        self.mock_forward(200, url="http://example.com/s3cret/hooks.php")
+        response = self.app.get('/hooks')
+        self.assertEqual("Send at http://example.com/***/hooks.php\n",
+                         response.body)
+
+
+class PoolTestFailover(TestHelper):
+    """Test pool members known down by failover"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks": {
+                'url': "/hooks",
+                'methods': ["GET"],
+                'forwards': [
+                    {'pool': ["http://a.example.com/hooks.php",
+                              "http://b.example.com/hooks.php"],
+                     'fallbacks': ["http://f.example.com/hooks.php"],
+                     'method': "GET"},
+                ]
+            }
+        })
+
+    def tearDown(self):
+        main.health.clear()
+        TestHelper.tearDown(self)
+
+    def test_member_down(self):
+        """Check that member down is skipped"""
+        main.health.mark_down("http://a.example.com/hooks.php")
+        self.mock_forward(200, url="http://b.example.com/hooks.php")
+        response = self.app.get('/hooks')
+        self.assertEqual("Send at http://b.example.com/hooks.php\n",
+                         response.body)
+
+    def test_all_members_down(self):
+        """Check that fallback is not counted as pool member"""
+        main.health.mark_down("http://a.example.com/hooks.php")
+        main.health.mark_down("http://b.example.com/hooks.php")
+        self.mock_forward(200, url="http://f.example.com/hooks.php")
+        response = self.app.get('/hooks')
+        self.assertEqual("Send at http://f.example.com/hooks.php\n",
+                         response.body)
+        for member in self.config['/hooks'].forwards[0].pool.members:
+            self.assertEqual(member.latency, None)
+
+
+class AdmissionTestSharedHandler(TestHelper):
+    """Test admission with requests running together in shared handlers"""
+
+    def get_config(self):
+        return DummyYamlOptions(dict([
+            (url, {'url': url,
+                   'methods': ["GET"],
+                   'max_inflight': 5,
+                   'forwards': [{'url': "http://example.com" + url,
+                                 'method': "GET"}]})
+            for url in ("/a", "/b")]))
+
+    def test_interleaved_requests(self):
+        """Check that each request release its own route"""
+        def urlforward(url, **args):
+            if url.endswith('/a'):
+                # second request run while first is forwarded
+                self.assertEqual('200 OK', self.app.get('/b').status)
+            return 200
+        main.urlforward = urlforward
+        response = self.app.get('/a')
+        self.assertEqual('200 OK', response.status)
+        self.assertEqual("Send at http://example.com/a\n", response.body)
+        self.failIf(main.admission.inflight)
+
+
+class DeadLetterTestSetParam(TestHelper):
+    """Test that 'set' values are not stored in dead letters"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks": {
+                'url': "/hooks",
+                'methods': ["GET"],
+                'forwards': [
+                    {'url': "http://example.com/hooks.php",
+                     'method': "GET",
+                     'dead_letter': True,
+                     'set': {'ftppassword': "s3cret"}},
+                ]
+            }
+        })
+
+    def setUp(self):
+        TestHelper.setUp(self)
+        self.recorded = []
+        self.old_record = main.deadletter.record
+        main.deadletter.record = lambda *args: self.recorded.append(args)
+
+    def tearDown(self):
+        main.deadletter.record = self.old_record
+        TestHelper.tearDown(self)
+
+    def test_set_not_recorded(self):
+        """Check that dead letter get request param only"""
+        self.mock_forward(500, param={'id': "1", 'ftppassword': "s3cret"})
+        response = self.app.get('/hooks?id=1', expect_errors=True)
+        self.assertEqual('500 Internal Server Error', response.status)
+        self.assertEqual(len(self.recorded), 1)
+        self.assertEqual(self.recorded[0][5], {'id': "1"})
+
+
+class IdempotencyTestInProgress(TestHelper):
+    """Test request resent while first one is forwarded"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks": {
+                'url': "/hooks",
+                'methods': ["GET"],
+                'idempotency_key': "X-Delivery-Id",
+                'forwards': [
+                    {'url': "http://example.com/hooks.php",
+                     'method': "GET"},
+                ]
+            }
+        })
+
+    def test_resent_not_forwarded(self):
+        """Check that resent request is not forwarded again"""
+        headers = {'X-Delivery-Id': "d1"}
+        resent = []
+        def urlforward(url, **args):
+            resent.append(self.app.get('/hooks', headers=headers,
+                                       expect_errors=True))
+            return 200
+        main.urlforward = urlforward
+        response = self.app.get('/hooks', headers=headers)
+        self.assertEqual('200 OK', response.status)
+        self.assertEqual("Send at http://example.com/hooks.php\n",
+                         response.body)
+        self.assertEqual('409 Conflict', resent[0].status)
+        self.assertEqual("Houps: same request in progress\n",
+                         resent[0].body)
+        # then recorded outcome is replayed
+        response = self.app.get('/hooks', headers=headers)
+        self.assertEqual('true', response.headers['X-Idempotent-Replay'])
+        self.assertEqual('200 OK', response.status)
+        self.assertEqual("Send at http://example.com/hooks.php\n",
+                         response.body)
+
+
+class DelayedTestQueueError(TestHelper):
+    """Test forward not queued, with other forwards delivered"""
+
+    def get_config(self):
+        return DummyYamlOptions({
+            "/hooks": {
+                'url': "/hooks",
+                'methods': ["GET"],
+                'forwards': [
+                    {'url': "http://example.com/hooks.php",
+                     'method': "GET"},
+                    {'url': "http://example.com/later.php",
+                     'method': "GET",
+                     'delay': 30,
+                     'dead_letter': True},
+                ]
+            }
+        })
+
+    def setUp(self):
+        TestHelper.setUp(self)
+        self.recorded = []
+        self.old_record = main.deadletter.record
+        main.deadletter.record = lambda *args: self.recorded.append(args)
+        self.old_defer = main.delayed.defer
+        def defer(*args):
+            raise main.taskqueue.TransientError()
+        main.delayed.defer = defer
+
+    def tearDown(self):
+        main.deadletter.record = self.old_record
+        main.delayed.defer = self.old_defer
+        TestHelper.tearDown(self)
+
+    def test_not_queued(self):
+        """Check that queue error only fail its forward"""
+        self.mock_forward(200, url="http://example.com/hooks.php")
+        response = self.app.get('/hooks', expect_errors=True)
+        self.assertEqual('503 Service Unavailable', response.status)
+        self.assert_("Send at http://example.com/hooks.php" in response.body)
+        self.assertEqual(len(self.recorded), 1)
+        self.assertEqual(self.recorded[0][3], "http://example.com/later.php")
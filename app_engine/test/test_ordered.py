@@ -0,0 +1,100 @@
+from google.appengine.ext import testbed
+from utils import ordered
+import os
+import unittest
+
+# application directory, with queue.yaml
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class OrderedTests(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=APP_DIR)
+        self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+        self.delivered = []
+        self.failing = set()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def deliver(self, route, forward, event):
+        if event.url in self.failing:
+            return False
+        self.delivered.append((route, forward, event.url,
+                               dict(event.param())))
+        return True
+
+    def tasks(self):
+        return self.taskqueue.get_filtered_tasks(
+            queue_names=[ordered.QUEUE_NAME])
+
+    def enqueue(self, key, *urls):
+        for url in urls:
+            ordered.enqueue('/hooks', 1, 'f1', key, url, {'id': url})
+
+    def testEnqueue(self):
+        """one drain task by key"""
+        self.enqueue('k1', 'http://a/1', 'http://a/2')
+        self.enqueue('k2', 'http://a/3')
+        self.assertEqual(len(self.tasks()), 2)
+        name = ordered.partition_name('/hooks', 1, 'k1')
+        partition = ordered.Partition.get_by_key_name(name)
+        self.assertEqual(partition.next_seq, 2)
+        self.assert_(partition.draining)
+
+    def testDrain(self):
+        """events of key are delivered in order"""
+        self.enqueue('k1', 'http://a/1', 'http://a/2')
+        name = ordered.partition_name('/hooks', 1, 'k1')
+        self.assert_(ordered.drain(name, self.deliver))
+        self.assertEqual(self.delivered,
+                         [('/hooks', 1, 'http://a/1', {'id': 'http://a/1'}),
+                          ('/hooks', 1, 'http://a/2', {'id': 'http://a/2'})])
+        self.failIf(ordered.Partition.get_by_key_name(name).draining)
+        # next event start a new drain task
+        self.enqueue('k1', 'http://a/3')
+        self.assertEqual(len(self.tasks()), 2)
+
+    def testFailure(self):
+        """failing event block next ones"""
+        self.enqueue('k1', 'http://a/1', 'http://a/2')
+        self.failing.add('http://a/1')
+        name = ordered.partition_name('/hooks', 1, 'k1')
+        self.failIf(ordered.drain(name, self.deliver))
+        self.assertEqual(self.delivered, [])
+        self.failing.clear()
+        self.assert_(ordered.drain(name, self.deliver))
+        self.assertEqual([url for (route, forward, url, param)
+                          in self.delivered], ['http://a/1', 'http://a/2'])
+
+    def testGiveUp(self):
+        """given up head event end task, next events get a new task"""
+        self.enqueue('k1', 'http://a/1', 'http://a/2', 'http://a/3')
+        self.failing.update(['http://a/1', 'http://a/2'])
+        given_up = []
+        name = ordered.partition_name('/hooks', 1, 'k1')
+        self.assert_(ordered.drain(name, self.deliver,
+                                   lambda route, forward, event:
+                                       given_up.append(event.url)))
+        self.assertEqual(given_up, ['http://a/1'])
+        self.assertEqual(len(self.tasks()), 2)
+        # new task retry its own head event
+        self.failIf(ordered.drain(name, self.deliver))
+        self.failing.clear()
+        self.assert_(ordered.drain(name, self.deliver))
+        self.assertEqual([url for (route, forward, url, param)
+                          in self.delivered], ['http://a/2', 'http://a/3'])
+
+    def testProgress(self):
+        """failure after delivered events continue in a new task"""
+        self.enqueue('k1', 'http://a/1', 'http://a/2')
+        self.failing.add('http://a/2')
+        name = ordered.partition_name('/hooks', 1, 'k1')
+        self.assert_(ordered.drain(name, self.deliver))
+        self.assertEqual(len(self.tasks()), 2)
+        self.failIf(ordered.drain(name, self.deliver))
@@ -0,0 +1,74 @@
+from utils.pool import Pool
+import unittest
+
+
+class PoolTests(unittest.TestCase):
+
+    urls = ["http://a.example.com/hooks",
+            "http://b.example.com/hooks",
+            "http://c.example.com/hooks"]
+
+    def choose_urls(self, pool, count, params=None):
+        return [pool.choose(params).url for i in range(count)]
+
+    def testRoundRobin(self):
+        """each destination in turn"""
+        pool = Pool(self.urls)
+        self.assertEqual(self.choose_urls(pool, 6), self.urls * 2)
+
+    def testWeighted(self):
+        """destination chosen proportionally to weight, interleaved"""
+        pool = Pool([{'url': self.urls[0], 'weight': 5},
+                     {'url': self.urls[1]},
+                     {'url': self.urls[2]}], 'weighted')
+        choice = self.choose_urls(pool, 7)
+        self.assertEqual(choice.count(self.urls[0]), 5)
+        self.assertEqual(choice.count(self.urls[1]), 1)
+        self.assertNotEqual(choice[:5], [self.urls[0]] * 5)
+
+    def testLeastOutstanding(self):
+        """destination with fewer running request"""
+        pool = Pool(self.urls, 'least_outstanding')
+        for member in pool.members[:2]:
+            pool.acquire(member)
+        self.assertEqual(self.choose_urls(pool, 3), [self.urls[2]] * 3)
+        pool.release(pool.members[0])
+        self.assertEqual(self.choose_urls(pool, 2)[0], self.urls[0])
+
+    def testEwma(self):
+        """destination with lower latency"""
+        pool = Pool(self.urls, 'ewma')
+        for (member, latency) in zip(pool.members, [0.5, 0.1, 0.3]):
+            pool.acquire(member)
+            pool.release(member, latency)
+        self.assertEqual(self.choose_urls(pool, 3), [self.urls[1]] * 3)
+
+    def testHash(self):
+        """same parameter value, same destination"""
+        pool = Pool(self.urls, 'hash', 'tenant')
+        choice = [pool.choose({'tenant': "t%d" % i}).url for i in range(50)]
+        self.assertEqual(choice,
+                         [pool.choose({'tenant': "t%d" % i}).url
+                          for i in range(50)])
+        self.assertEqual(len(set(choice)), 3)
+
+    def testHashMissKey(self):
+        """without parameter, fallback to round robin"""
+        pool = Pool(self.urls, 'hash', 'tenant')
+        self.assertEqual(self.choose_urls(pool, 3), self.urls)
+
+    def testSkipDown(self):
+        """member known down is skipped, unless all are down"""
+        pool = Pool(self.urls)
+        down = set([self.urls[0]])
+        is_down = lambda member: member.url in down
+        self.assertEqual([pool.choose(None, is_down).url for i in range(3)],
+                         [self.urls[1], self.urls[1], self.urls[2]])
+        down.update(self.urls)
+        self.assertEqual(pool.choose(None, is_down).url, self.urls[0])
+
+    def testInvalid(self):
+        """raise ValueError for bad config"""
+        self.assertRaises(ValueError, Pool, [])
+        self.assertRaises(ValueError, Pool, self.urls, 'random')
+        self.assertRaises(ValueError, Pool, self.urls, 'hash')
@@ -0,0 +1,63 @@
+from utils.responsecache import ResponseCache
+import unittest
+
+
+class DummyResult(object):
+
+    def __init__(self, status_code, headers={}, content=''):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class DummyFetch(object):
+    """record request headers and return results in order"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.headers = []
+
+    def __call__(self, url, headers, **args):
+        self.headers.append(dict(headers))
+        return self.results.pop(0)
+
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60)
+
+    def fetch(self, fetch, now):
+        return self.cache.fetch({'url': "http://example.com/?a=1",
+                                 'headers': {}}, fetch, now=now)
+
+    def testHit(self):
+        """response is reused during ttl"""
+        fetch = DummyFetch(DummyResult(200, content='x' * 10))
+        self.assertEqual(self.fetch(fetch, 0), 200)
+        self.assertEqual(self.fetch(fetch, 30), 200)
+        self.assertEqual(len(fetch.headers), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['bytes_saved'], 10)
+
+    def testRevalidate(self):
+        """after ttl, response is revalidated"""
+        fetch = DummyFetch(DummyResult(200, {'ETag': '"v1"',
+                                             'Last-Modified': 'yesterday'}),
+                           DummyResult(304))
+        self.fetch(fetch, 0)
+        self.assertEqual(self.fetch(fetch, 61), 200)
+        self.assertEqual(fetch.headers[1], {'If-None-Match': '"v1"',
+                                            'If-Modified-Since': 'yesterday'})
+        self.assertEqual(self.cache.stats()['revalidated'], 1)
+        # ttl is refreshed
+        self.assertEqual(self.fetch(fetch, 100), 200)
+        self.assertEqual(len(fetch.headers), 2)
+
+    def testNoCacheError(self):
+        """error responses are not cached"""
+        fetch = DummyFetch(DummyResult(500), DummyResult(200))
+        self.assertEqual(self.fetch(fetch, 0), 500)
+        self.assertEqual(self.fetch(fetch, 1), 200)
+        self.assertEqual(self.cache.stats()['hit_ratio'], 0.0)
@@ -0,0 +1,74 @@
+from utils.routedb import RouteDB, build
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+CONFIG_DEFAULT = {'url': "::dummy::",
+                  'methods': ["GET", "POST"],
+                  'forwards': [{'method': "POST"}]}
+
+
+def route(url):
+    return {'url': url, 'forwards': [{'url': "http://example.com/a"}]}
+
+
+class RouteDBTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.base_dir, 'routes.db')
+        build(self.db_path, {'/a': route('/a'),
+                             '/b': route('/b'),
+                             '/c/{tenant}': route('/c/{tenant}')},
+              CONFIG_DEFAULT)
+        self.db = RouteDB(self.db_path, max_items=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def testGet(self):
+        self.assertEqual(len(self.db), 3)
+        self.assertEqual(self.db['/a'].url, '/a')
+        self.assertEqual(self.db['/a'].forwards[0].method, 'POST')
+        self.assert_('/b' in self.db)
+        self.failIf('/d' in self.db)
+        self.assertRaises(KeyError, self.db.__getitem__, '/d')
+
+    def testCache(self):
+        """compiled route is kept, until evicted"""
+        plan = self.db['/a']
+        self.assert_(self.db['/a'] is plan)
+        self.db['/b']
+        self.assert_(self.db['/a'] is not plan)
+        self.assertEqual(self.db.stats()['evictions'], 2)
+
+    def testMatch(self):
+        self.assertEqual(self.db.match('/a')[0].url, '/a')
+        (plan, captures) = self.db.match('/c/acme')
+        self.assertEqual(plan.url, '/c/{tenant}')
+        self.assertEqual(captures, {'tenant': 'acme'})
+        self.assertEqual(self.db.match('/d'), (None, None))
+
+    def testReload(self):
+        """new index is read after build"""
+        self.assertEqual(self.db.reload(), False)
+        build(self.db_path, {'/d': route('/d')}, CONFIG_DEFAULT)
+        self.assertEqual(self.db.reload(), True)
+        self.assert_('/d' in self.db)
+        self.failIf('/a' in self.db)
+
+    def testReloadClose(self):
+        """replaced index is closed"""
+        previous = self.db._connection
+        build(self.db_path, {'/d': route('/d')}, CONFIG_DEFAULT)
+        self.db.reload()
+        self.assertRaises(sqlite3.ProgrammingError, previous.execute,
+                          "SELECT 1")
+
+    def testInvalid(self):
+        """index is not written if a route is invalid"""
+        self.assertRaises(KeyError, build, self.db_path,
+                          {'/d': {'url': '/d'}}, CONFIG_DEFAULT)
+        self.assert_('/a' in self.db)
@@ -0,0 +1,59 @@
+from utils.routeindex import RouteIndex
+import unittest
+
+
+class RouteIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = RouteIndex({
+            '/exact': 'exact',
+            '/hooks/{tenant}/event': 'segment',
+            '/hooks/main/event': 'literal',
+            '/static/*': 'prefix',
+            '/*': 'all',
+            r'^/v(?P<version>\d+)/event$': 'regex',
+            r'^/w(?P<version>\d+)/event$': 'other regex',
+        })
+
+    def testExact(self):
+        self.assertEqual(self.index.match('/exact'), ('exact', {}))
+        self.assertEqual(self.index['/exact'], 'exact')
+
+    def testSegment(self):
+        self.assertEqual(self.index.match('/hooks/acme/event'),
+                         ('segment', {'tenant': 'acme'}))
+
+    def testLiteralFirst(self):
+        self.assertEqual(self.index.match('/hooks/main/event'),
+                         ('literal', {}))
+
+    def testPrefix(self):
+        self.assertEqual(self.index.match('/static/a/b.css'),
+                         ('prefix', {'path': 'a/b.css'}))
+        self.assertEqual(self.index.match('/hooks/acme/other'),
+                         ('all', {'path': 'hooks/acme/other'}))
+
+    def testRegex(self):
+        index = RouteIndex({r'^/v(?P<version>\d+)/event$': 'regex',
+                            r'^/w(?P<version>\d+)/event$': 'other regex'})
+        self.assertEqual(index.match('/v2/event'),
+                         ('regex', {'version': '2'}))
+        self.assertEqual(index.match('/w3/event'),
+                         ('other regex', {'version': '3'}))
+        self.assertEqual(index.match('/x3/event'), (None, None))
+
+    def testManyRegex(self):
+        """more regex routes than groups of a regex"""
+        index = RouteIndex([(r'^/t%d/(?P<id>\d+)$' % i, i)
+                            for i in range(120)])
+        self.assertEqual(index.match('/t0/1'), (0, {'id': '1'}))
+        self.assertEqual(index.match('/t119/2'), (119, {'id': '2'}))
+        self.assertEqual(index.match('/t120/2'), (None, None))
+
+    def testNotFound(self):
+        index = RouteIndex({'/exact': 'exact'})
+        self.assertEqual(index.match('/other'), (None, None))
+        self.assertEqual(index.match('/exact/'), (None, None))
+
+    def testInvalidSegment(self):
+        self.assertRaises(ValueError, RouteIndex, {'/a{b}': 'invalid'})
@@ -0,0 +1,122 @@
+from utils.routeplan import compile_route, forward_fingerprint
+import unittest
+
+
+class RoutePlanTests(unittest.TestCase):
+
+    config_default = {'url': "::dummy::",
+                      'methods': ["GET", "POST"],
+                      'forwards': [{'method': "POST",
+                                    'remove': [],
+                                    'default': {},
+                                    'set': {}}]}
+
+    def setUp(self):
+        self.plan = compile_route({
+            'url': "/request_url",
+            'forwards': [{'url': "http://example.com/a_hooks.php",
+                          'method': "GET",
+                          'remove': ["a", "b"],
+                          'only': ["c"],
+                          'login': "user",
+                          'password': "secret"},
+                         {'url': "http://example.com/{tenant}"}],
+            }, self.config_default)
+
+    def testRouteDefault(self):
+        """default route values are merged"""
+        self.assertEqual(self.plan.url, "/request_url")
+        self.assertEqual(self.plan.methods, frozenset(["GET", "POST"]))
+        self.assertEqual(self.plan.remote_addr, None)
+        self.assertEqual(self.plan.idempotency, None)
+
+    def testForward(self):
+        """forward values are compiled"""
+        forward = self.plan.forwards[0]
+        self.assertEqual(forward.index, 0)
+        self.assertEqual(forward.remove, frozenset(["a", "b"]))
+        self.assertEqual(forward.only, frozenset(["c"]))
+        self.assertEqual(forward.fetch_param['method'], "GET")
+        self.assertEqual(forward.fetch_param['headers'],
+                         (('Authorization', 'Basic dXNlcjpzZWNyZXQ='), ))
+
+    def testForwardDefault(self):
+        """default forward values are merged"""
+        forward = self.plan.forwards[1]
+        self.assertEqual(forward.method, "POST")
+        self.assertEqual(forward.only, None)
+        self.assertEqual(forward.fetch_param['headers'], ())
+        self.assertEqual(forward.url_template.names, ('tenant', ))
+
+    def testFingerprint(self):
+        """fingerprint only change with destination of forward"""
+        config = {'url': "http://example.com/a", 'method': "POST",
+                  'headers': {'X-Token': "a"}}
+        fingerprint = forward_fingerprint(config)
+        self.assertEqual(forward_fingerprint(dict(config, headers={})),
+                         fingerprint)
+        unicode_url = dict(config, url=u"http://example.com/a")
+        self.assertEqual(forward_fingerprint(unicode_url), fingerprint)
+        self.assertNotEqual(forward_fingerprint(dict(config,
+                                                     url="http://other/a")),
+                            fingerprint)
+        self.assertNotEqual(self.plan.forwards[0].fingerprint,
+                            self.plan.forwards[1].fingerprint)
+
+    def testSlots(self):
+        """plans are flat objects"""
+        self.assertRaises(AttributeError, setattr, self.plan, 'other', 1)
+
+    def testInvalidPriority(self):
+        self.assertRaises(ValueError, compile_route,
+                          {'url': "/request_url", 'priority': "urgent",
+                           'forwards': []}, self.config_default)
+
+    def testVersions(self):
+        """forwards of all versions, version choose its own"""
+        plan = compile_route({
+            'url': "/request_url",
+            'versions': [{'name': "stable", 'weight': 1,
+                          'forwards': [{'url': "http://example.com/a"}]},
+                         {'name': "canary", 'weight': 0,
+                          'forwards': [{'url': "http://example.com/b"}]}],
+            }, self.config_default)
+        self.assertEqual([forward.url for forward in plan.forwards],
+                         ["http://example.com/a", "http://example.com/b"])
+        self.assertEqual(plan.forwards[1].index, 1)
+        (name, forwards) = plan.canary.version('any')
+        self.assertEqual(name, "stable")
+        self.assert_(forwards[0] is plan.forwards[0])
+
+
+class RecompileTests(unittest.TestCase):
+    """Unchanged routes and forwards are kept by compile"""
+
+    config_default = RoutePlanTests.config_default
+
+    def setUp(self):
+        self.config = {'url': "/request_url",
+                       'idempotency_key': "X-Id",
+                       'forwards': [{'url': "http://example.com/a"},
+                                    {'url': "http://example.com/b"}]}
+        self.plan = compile_route(self.config, self.config_default)
+
+    def testUnchanged(self):
+        self.assert_(compile_route(self.config, self.config_default,
+                                   self.plan) is self.plan)
+
+    def testChangedForward(self):
+        """only changed forward is compiled"""
+        self.config['forwards'][1]['method'] = "GET"
+        plan = compile_route(self.config, self.config_default, self.plan)
+        self.assert_(plan is not self.plan)
+        self.assert_(plan.forwards[0] is self.plan.forwards[0])
+        self.assert_(plan.forwards[1] is not self.plan.forwards[1])
+        self.assert_(plan.idempotency is self.plan.idempotency)
+
+    def testChangedDefault(self):
+        """default values are compared"""
+        config_default = dict(self.config_default, methods=["GET"])
+        plan = compile_route(self.config, config_default, self.plan)
+        self.assert_(plan is not self.plan)
+        self.assert_(plan.forwards[0] is self.plan.forwards[0])
@@ -0,0 +1,102 @@
+from google.appengine.api import memcache
+from google.appengine.ext import testbed
+from utils.routestore import RouteStore
+from utils import routestore
+from utils.routeindex import RouteIndex
+from utils.routeplan import compile_route
+import unittest
+
+CONFIG_DEFAULT = {'url': "::dummy::",
+                  'methods': ["GET", "POST"],
+                  'forwards': [{'method': "POST"}]}
+
+
+def route(url):
+    return {'url': url, 'forwards': [{'url': "http://example.com/a"}]}
+
+
+class DummyRouteStore(RouteStore):
+    """Routes in a dict instead of datastore"""
+
+    def __init__(self, routes, **args):
+        self.routes = routes
+        self.version = 1
+        self.fetches = 0
+        RouteStore.__init__(self, CONFIG_DEFAULT, **args)
+
+    def _fetch(self, url):
+        self.fetches += 1
+        return self.routes.get(url)
+
+    def _fetch_patterns(self):
+        return [item for (url, item) in self.routes.items()
+                if '{' in url]
+
+    def _fetch_version(self):
+        return self.version
+
+
+class RouteStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.store = DummyRouteStore({'/a': route('/a'),
+                                      '/c/{tenant}': route('/c/{tenant}')})
+
+    def testGet(self):
+        self.assertEqual(self.store.get('/a', now=0).url, '/a')
+        self.assertEqual(self.store.get('/b', now=0), None)
+        self.assertRaises(KeyError, self.store.__getitem__, '/b')
+
+    def testCache(self):
+        """store is read once by URL, found or not"""
+        plan = self.store.get('/a', now=0)
+        self.store.get('/b', now=0)
+        self.assert_(self.store.get('/a', now=1) is plan)
+        self.assertEqual(self.store.get('/b', now=1), None)
+        self.assertEqual(self.store.fetches, 2)
+
+    def testMatch(self):
+        self.assertEqual(self.store.match('/a', now=0)[0].url, '/a')
+        (plan, captures) = self.store.match('/c/acme', now=0)
+        self.assertEqual(plan.url, '/c/{tenant}')
+        self.assertEqual(captures, {'tenant': 'acme'})
+        self.assertEqual(self.store.match('/d', now=0), (None, None))
+
+    def testVersion(self):
+        """cache is dropped when version change, checked after interval"""
+        self.assertEqual(self.store.get('/b', now=0), None)
+        self.store.routes['/b'] = route('/b')
+        self.store.version = 2
+        self.assertEqual(self.store.get('/b', now=1), None)
+        self.assertEqual(self.store.get('/b', now=100).url, '/b')
+
+    def testBase(self):
+        """routes of base are looked up first"""
+        base = RouteIndex({'/a': compile_route(route('/a'), CONFIG_DEFAULT)})
+        store = DummyRouteStore({'/a': route('/a')}, base=base)
+        self.assert_(store.get('/a', now=0) is base['/a'])
+        self.assert_(store.match('/a', now=0)[0] is base['/a'])
+        self.assertEqual(store.fetches, 0)
+
+
+class VersionTests(unittest.TestCase):
+    """Version counter of stored routes"""
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def testChange(self):
+        """changed version is read again from datastore"""
+        memcache.set(routestore.VERSION_KEY, 7)
+        routestore.put_route(route('/a'), CONFIG_DEFAULT)
+        self.assertEqual(memcache.get(routestore.VERSION_KEY), None)
+        # older version read before change is not cached
+        self.failIf(memcache.add(routestore.VERSION_KEY, 0))
+        self.assertEqual(routestore.RouteVersion.get_by_key_name(
+            'version').version, 1)
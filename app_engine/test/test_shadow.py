@@ -0,0 +1,50 @@
+from google.appengine.ext import testbed
+from utils import shadow
+from utils import metrics
+import cgi
+import os
+import unittest
+
+# application directory, with queue.yaml
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ShadowTests(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_taskqueue_stub(root_path=APP_DIR)
+        self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def testDefer(self):
+        """shadow forward is queued, not sent by request"""
+        shadow.defer('/hooks', 1, 'f1', 'http://new/{id}', 'http://new/1',
+                     {'a': '1'})
+        tasks = self.taskqueue.get_filtered_tasks(
+            queue_names=[shadow.QUEUE_NAME])
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].url, shadow.TASK_URL)
+        params = dict(cgi.parse_qsl(tasks[0].payload))
+        self.assertEqual(params['route'], '/hooks')
+        self.assertEqual(params['forward'], '1')
+        self.assertEqual(params['fingerprint'], 'f1')
+        self.assertEqual(params['name'], 'http://new/{id}')
+        self.assertEqual(params['payload'], 'a=1')
+
+    def testRecord(self):
+        """results only go to metrics"""
+        shadow.record('a', 200, 0.1)
+        shadow.record('a', None, 0.2)
+        self.assertEqual(metrics.get('shadow.sent'), 2)
+        self.assertEqual(metrics.get('shadow.status.200'), 1)
+        self.assertEqual(metrics.get('shadow.status.error'), 1)
+        self.assertEqual(metrics.get('shadow.a.count'), 2)
+
+    def testSample(self):
+        self.assert_(shadow.sample(100))
+        self.failIf(shadow.sample(0))
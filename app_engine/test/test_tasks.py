@@ -0,0 +1,177 @@
+from google.appengine.ext import testbed
+from utils.routeplan import compile_routes
+from utils.deadletter import DeadLetter
+from utils import ordered
+from utils import metrics
+import tasks
+import cgi
+import copy
+import os
+import time
+import unittest
+import webob
+
+# application directory, with queue.yaml
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = {'/hooks': {'url': '/hooks',
+                     'methods': ['POST'],
+                     'forwards': [{'url': "http://example.com/{id}",
+                                   'method': 'POST',
+                                   'dead_letter': True,
+                                   'set': {'ftppassword': "s3cret"}}]}}
+
+
+class DummyConfig(object):
+    """Config compiled from routes, compiled again by reload"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.data = compile_routes(routes, {'forwards': [{}]})
+        self.reloads = 0
+
+    def __contains__(self, url):
+        return url in self.data
+
+    def __getitem__(self, url):
+        return self.data[url]
+
+    def reload(self):
+        self.reloads += 1
+        self.data = compile_routes(self.routes, {'forwards': [{}]},
+                                   self.data)
+        return True
+
+
+class TasksTests(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=APP_DIR)
+        self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+        metrics.reset()
+        self.old_config = (tasks.config, tasks.checked)
+        tasks.config = DummyConfig(copy.deepcopy(ROUTES))
+        tasks.checked = time.time()
+        self.fingerprint = tasks.config['/hooks'].forwards[0].fingerprint
+        self.old_urlforward = tasks.urlforward
+        tasks.urlforward = self.urlforward
+        self.sent = []
+        self.status_code = 200
+
+    def tearDown(self):
+        (tasks.config, tasks.checked) = self.old_config
+        tasks.urlforward = self.old_urlforward
+        self.testbed.deactivate()
+
+    def urlforward(self, url, param, **fetch_param):
+        self.sent.append((url, param))
+        return self.status_code
+
+    def request(self, path, retry_count=0, **params):
+        return webob.Request.blank(
+            path, POST=params,
+            headers={'X-AppEngine-TaskRetryCount': str(retry_count)})
+
+    def testForward(self):
+        """'set' parameters are added at delivery"""
+        request = self.request('/_tasks/forward', route='/hooks',
+                               forward='0', fingerprint=self.fingerprint,
+                               url="http://example.com/1", payload="id=1")
+        self.assert_(tasks.forward_task(request))
+        self.assertEqual(self.sent, [("http://example.com/1",
+                                      {'id': "1", 'ftppassword': "s3cret"})])
+
+    def testForwardRetry(self):
+        """failed forward is retried, then stored as dead letter"""
+        self.status_code = 500
+        params = dict(route='/hooks', forward='0',
+                      fingerprint=self.fingerprint,
+                      url="http://example.com/1", payload="id=1")
+        self.failIf(tasks.forward_task(self.request('/_tasks/forward',
+                                                    **params)))
+        self.assertEqual(DeadLetter.all().count(), 0)
+        self.assert_(tasks.forward_task(self.request('/_tasks/forward',
+                                                     tasks.MAX_RETRY,
+                                                     **params)))
+        dead_letter = DeadLetter.all().get()
+        self.assertEqual(dead_letter.payload, "id=1")
+
+    def testConfigChanged(self):
+        """forward not in config anymore is dropped"""
+        request = self.request('/_tasks/forward', route='/other',
+                               forward='0', fingerprint=self.fingerprint,
+                               url="http://example.com/1", payload="id=1")
+        self.assert_(tasks.forward_task(request))
+        self.assertEqual(self.sent, [])
+
+    def testForwardChanged(self):
+        """forward whose destination changed is dropped"""
+        now = time.time() + tasks.RELOAD_INTERVAL
+        tasks.config.routes['/hooks']['forwards'][0]['url'] = \
+            "http://other.example.com/{id}"
+        # changes are seen after RELOAD_INTERVAL
+        tasks.get_config(now - 1)
+        self.assertEqual(tasks.config.reloads, 0)
+        tasks.get_config(now)
+        self.assertEqual(tasks.config.reloads, 1)
+        request = self.request('/_tasks/forward', route='/hooks',
+                               forward='0', fingerprint=self.fingerprint,
+                               url="http://example.com/1", payload="id=1")
+        self.assert_(tasks.forward_task(request))
+        self.assertEqual(self.sent, [])
+
+    def run_ordered(self):
+        """Run ordered tasks as task queue does : a failed task is
+        retried with increasing retry count, return count of attempts
+        """
+        attempts = 0
+        while True:
+            queued = self.taskqueue.get_filtered_tasks(
+                queue_names=[ordered.QUEUE_NAME])
+            if not queued:
+                return attempts
+            self.taskqueue.FlushQueue(ordered.QUEUE_NAME)
+            for task in queued:
+                name = dict(cgi.parse_qsl(task.payload))['partition']
+                retry = 0
+                while True:
+                    attempts += 1
+                    if tasks.ordered_task(self.request('/_tasks/ordered',
+                                                       retry,
+                                                       partition=name)):
+                        break
+                    retry += 1
+
+    def testOrdered(self):
+        """events of key are delivered in order"""
+        for i in range(3):
+            ordered.enqueue('/hooks', 0, self.fingerprint, 'k1',
+                            "http://example.com/%d" % i, {'id': str(i)})
+        self.assertEqual(self.run_ordered(), 1)
+        self.assertEqual([url for (url, param) in self.sent],
+                         ["http://example.com/0", "http://example.com/1",
+                          "http://example.com/2"])
+
+    def testOrderedGiveUp(self):
+        """each event get all retries before being given up"""
+        for i in range(3):
+            ordered.enqueue('/hooks', 0, self.fingerprint, 'k1',
+                            "http://example.com/%d" % i, {'id': str(i)})
+        self.status_code = 500
+        self.assertEqual(self.run_ordered(), 3 * (tasks.MAX_RETRY + 1))
+        self.assertEqual(len(self.sent), 3 * (tasks.MAX_RETRY + 1))
+        self.assertEqual(DeadLetter.all().count(), 3)
+
+    def testShadow(self):
+        """shadow result only go to metrics, never retried"""
+        self.status_code = 500
+        request = self.request('/_tasks/shadow', route='/hooks',
+                               forward='0', fingerprint=self.fingerprint,
+                               name="http://example.com/{id}",
+                               url="http://example.com/1", payload="id=1")
+        self.assert_(tasks.shadow_task(request))
+        self.assertEqual(metrics.get('shadow.status.500'), 1)
@@ -0,0 +1,54 @@
+from utils.urltemplate import UrlTemplate
+import unittest
+
+
+class UrlTemplateTests(unittest.TestCase):
+
+    def testStatic(self):
+        """URL without placeholder is returned as is"""
+        template = UrlTemplate("http://example.com/hooks?a=1")
+        self.assertEqual(template.names, ())
+        self.assertEqual(template.expand({'a': 2}),
+                         "http://example.com/hooks?a=1")
+
+    def testExpand(self):
+        """placeholder are filled"""
+        template = UrlTemplate("http://example.com/{tenant}/{hook}")
+        self.assertEqual(template.names, ('tenant', 'hook'))
+        self.assertEqual(template.expand({'tenant': 'foo', 'hook': 'bar'}),
+                         "http://example.com/foo/bar")
+
+    def testLookupOrder(self):
+        """take value in first mapping"""
+        template = UrlTemplate("http://example.com/{tenant}")
+        self.assertEqual(template.expand({}, {'tenant': 'a'},
+                                         {'tenant': 'b'}),
+                         "http://example.com/a")
+
+    def testEscape(self):
+        """value can't add path segment or parameter"""
+        template = UrlTemplate("http://example.com/{tenant}/hooks")
+        self.assertEqual(template.expand({'tenant': '../a?b=c d'}),
+                         "http://example.com/..%2Fa%3Fb%3Dc%20d/hooks")
+        self.assertEqual(template.expand({'tenant': u'\xe9'}),
+                         "http://example.com/%C3%A9/hooks")
+
+    def testShown(self):
+        """shown template is filled as template"""
+        template = UrlTemplate("http://example.com/s3cret/{tenant}",
+                               "http://example.com/***/{tenant}")
+        self.assertEqual(template.expand({'tenant': 'a'}),
+                         "http://example.com/s3cret/a")
+        self.assertEqual(template.expand_shown({'tenant': 'a'}),
+                         "http://example.com/***/a")
+        self.assertEqual(str(template), "http://example.com/***/{tenant}")
+
+    def testMissKey(self):
+        """raise KeyError if a placeholder is not found"""
+        template = UrlTemplate("http://example.com/{tenant}")
+        self.assertRaises(KeyError, template.expand, {'other': 'a'})
+
+    def testInvalid(self):
+        """raise ValueError for malformed placeholder"""
+        self.assertRaises(ValueError, UrlTemplate, "http://example.com/{a")
+        self.assertRaises(ValueError, UrlTemplate, "http://example.com/{}")
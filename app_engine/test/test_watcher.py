@@ -0,0 +1,67 @@
+from utils.watcher import Watcher
+from utils import watcher as watcher_module
+import os
+import time
+import unittest
+
+
+class DummyConfig(object):
+
+    def __init__(self, results, paths=()):
+        self.results = list(results)
+        self.reloads = 0
+        self._paths = list(paths)
+
+    def reload(self):
+        self.reloads += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def paths(self):
+        return self._paths
+
+
+class WatcherTests(unittest.TestCase):
+
+    def testCheck(self):
+        watcher = Watcher(DummyConfig([True, False]))
+        self.assertEqual(watcher.check(), True)
+        self.assertEqual(watcher.check(), False)
+
+    def testCheckInvalid(self):
+        """invalid config is ignored"""
+        watcher = Watcher(DummyConfig([KeyError('url')]))
+        self.assertEqual(watcher.check(), False)
+
+    def testPoll(self):
+        config = DummyConfig([False] * 100)
+        watcher = Watcher(config, interval=0.01)
+        watcher.start()
+        while not config.reloads:
+            time.sleep(0.01)
+        watcher.stop()
+        watcher.join(1)
+        self.failIf(watcher.isAlive())
+
+    def testNoPaths(self):
+        """nothing to watch"""
+        self.assertEqual(watcher_module.start(DummyConfig([])), None)
+
+    def testNoThreads(self):
+        """dummy_threading would run watcher in place"""
+        old_thread = watcher_module.thread
+        watcher_module.thread = None
+        try:
+            self.assertEqual(watcher_module.start(
+                DummyConfig([], ['config.yaml'])), None)
+        finally:
+            watcher_module.thread = old_thread
+
+    def testStart(self):
+        config = DummyConfig([False] * 100, [os.path.abspath(__file__)])
+        watcher = watcher_module.start(config, interval=0.01)
+        self.assert_(watcher.isAlive())
+        watcher.stop()
+        watcher.join(1)
@@ -0,0 +1,213 @@
+from utils.yamloptions import YamlOptions
+import os
+import shutil
+import tempfile
+import unittest
+
+CONFIG_DEFAULT = """
+- url: "::dummy::"
+  methods: [GET, POST]
+  forwards:
+    - method: POST
+"""
+
+CONFIG = """
+- url: /a
+  forwards:
+    - url: http://example.com/a
+- url: /b
+  forwards:
+    - url: http://example.com/b
+"""
+
+CONFIG_LOCAL = """
+- url: /c
+  forwards:
+    - url: http://example.com/c
+"""
+
+
+def write(base_dir, name, content, mtime=None):
+    path = os.path.join(base_dir, name)
+    f = open(path, 'w')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class YamlOptionsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.write('config-default.yaml', CONFIG_DEFAULT)
+        self.write('config.yaml', CONFIG)
+        self.write('config-local.yaml', CONFIG_LOCAL)
+        self.options = YamlOptions(['config-local.yaml', 'config.yaml'],
+                                   'config-default.yaml', self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def write(self, name, content, mtime=None):
+        write(self.base_dir, name, content, mtime)
+
+    def testLoad(self):
+        self.assertEqual(sorted(self.options.keys()), ['/a', '/b', '/c'])
+        self.assertEqual(self.options['/a'].forwards[0].method, 'POST')
+
+    def testReloadUnchanged(self):
+        """no change, same plans"""
+        plan = self.options['/a']
+        self.assertEqual(self.options.reload(), False)
+        self.assert_(self.options['/a'] is plan)
+
+    def testReloadTouched(self):
+        """same content, not parsed again"""
+        plan = self.options['/a']
+        self.write('config.yaml', CONFIG, mtime=1)
+        self.assertEqual(self.options.reload(), False)
+        self.assert_(self.options['/a'] is plan)
+
+    def testReloadChangedFile(self):
+        """only changed routes are compiled"""
+        plan_a = self.options['/a']
+        plan_c = self.options['/c']
+        self.write('config.yaml', CONFIG.replace('/b', '/d'), mtime=1)
+        self.assertEqual(self.options.reload(), True)
+        self.assertEqual(sorted(self.options.keys()), ['/a', '/c', '/d'])
+        self.assert_(self.options['/a'] is plan_a)
+        self.assert_(self.options['/c'] is plan_c)
+
+    def testReloadChangedDefault(self):
+        """all routes are compiled"""
+        plan_c = self.options['/c']
+        self.write('config-default.yaml',
+                   CONFIG_DEFAULT.replace('POST', 'GET'), mtime=1)
+        self.assertEqual(self.options.reload(), True)
+        self.assert_(self.options['/c'] is not plan_c)
+        self.assertEqual(self.options['/c'].forwards[0].method, 'GET')
+
+    def testReloadInvalid(self):
+        """invalid config raise, current plans are kept"""
+        plan_a = self.options['/a']
+        self.write('config.yaml', CONFIG.replace('url: http', 'urlx: http'),
+                   mtime=1)
+        self.assertRaises(KeyError, self.options.reload)
+        self.assert_(self.options['/a'] is plan_a)
+        self.write('config.yaml', CONFIG, mtime=2)
+        self.assertEqual(self.options.reload(), True)
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.base_dir, 'config-cache')
+        write(self.base_dir, 'config-default.yaml', CONFIG_DEFAULT)
+        write(self.base_dir, 'config.yaml', CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def load(self):
+        return YamlOptions(['config.yaml'], 'config-default.yaml',
+                           self.base_dir, self.cache_dir)
+
+    def testSnapshotSaved(self):
+        self.load()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def testSnapshotPruned(self):
+        """snapshot of previous content is removed"""
+        options = self.load()
+        write(self.base_dir, 'config.yaml', CONFIG_LOCAL, mtime=1)
+        self.assertEqual(options.reload(), True)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self.assertEqual(sorted(self.load().keys()), ['/c'])
+
+    def testSnapshotLoaded(self):
+        """yaml is not parsed when snapshot exist"""
+        self.load()
+        import utils.yamloptions
+        parse_config = utils.yamloptions.parse_config
+        utils.yamloptions.parse_config = None
+        try:
+            options = self.load()
+        finally:
+            utils.yamloptions.parse_config = parse_config
+        self.assertEqual(sorted(options.keys()), ['/a', '/b'])
+
+
+DIR_DEFAULTS = """
+- url: "::dummy::"
+  methods: [POST]
+  forwards:
+    - method: GET
+"""
+
+TEMPLATES = """
+- url: "::templates::"
+  templates:
+    crm:
+      url: http://crm.example.com/hooks
+      method: PUT
+- url: /t
+  forwards:
+    - template: crm
+    - template: crm
+      method: DELETE
+"""
+
+
+class LayersTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.base_dir, 'config.d', 'sub'))
+        write(self.base_dir, 'config-default.yaml', CONFIG_DEFAULT)
+        write(self.base_dir, 'config.yaml', CONFIG)
+        write(self.base_dir, 'config.d/_defaults.yaml', DIR_DEFAULTS)
+        write(self.base_dir, 'config.d/local.yaml', CONFIG_LOCAL)
+        write(self.base_dir, 'config.d/sub/templates.yaml', TEMPLATES)
+        self.options = YamlOptions(['config.yaml', 'config.d'],
+                                   'config-default.yaml', self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def testInclude(self):
+        self.assertEqual(sorted(self.options.keys()),
+                         ['/a', '/b', '/c', '/t'])
+
+    def testDirectoryDefaults(self):
+        """defaults of directory are over default file"""
+        self.assertEqual(self.options['/a'].methods,
+                         frozenset(['GET', 'POST']))
+        self.assertEqual(self.options['/a'].forwards[0].method, 'POST')
+        self.assertEqual(self.options['/c'].methods, frozenset(['POST']))
+        self.assertEqual(self.options['/c'].forwards[0].method, 'GET')
+
+    def testTemplate(self):
+        """forward values, then template, then defaults"""
+        forwards = self.options['/t'].forwards
+        self.assertEqual(forwards[0].url, 'http://crm.example.com/hooks')
+        self.assertEqual(forwards[0].method, 'PUT')
+        self.assertEqual(forwards[1].method, 'DELETE')
+        self.assertEqual(self.options['/t'].methods, frozenset(['POST']))
+
+    def testNewFile(self):
+        """file added in include directory is loaded"""
+        write(self.base_dir, 'config.d/new.yaml',
+              CONFIG_LOCAL.replace('/c', '/n'))
+        self.assertEqual(self.options.reload(), True)
+        self.assert_('/n' in self.options)
+        self.assertEqual(len(self.options.paths()), 6)
+
+    def testUnknownTemplate(self):
+        write(self.base_dir, 'config.d/new.yaml',
+              "- url: /n\n  forwards:\n    - template: erp\n")
+        self.assertRaises(ValueError, self.options.reload)
+        self.failIf('/n' in self.options)
@@ -28,3 +28,42 @@ class Chainmap(UserDict.DictMixin):
             except KeyError:
                 pass
         raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        """Set in first mapping"""
+        self._maps[0][key] = value
+
+    def __delitem__(self, key):
+        """Delete from first mapping"""
+        del self._maps[0][key]
+
+    def __contains__(self, key):
+        for mapping in self._maps:
+            if key in mapping:
+                return True
+        return False
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        for mapping in self._maps:
+            if key in mapping:
+                return mapping[key]
+        return default
+
+    def keys(self):
+        """Keys of all mappings, in lookup order"""
+        seen = set()
+        keys = []
+        for mapping in self._maps:
+            for key in mapping.keys():
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+admission.py
+
+Admission control : limit running requests of process, globally and by
+route. When full, requests wait in a bounded queue, then are rejected
+(503 with Retry-After).
+
+Route priority gives its share of global capacity, so low priority
+routes are rejected first when load grows :
+ - low : 50 %
+ - normal : 80 %
+ - high : 100 %
+
+Limits only apply to requests running concurrently in a process : on
+a runtime running one request at a time by instance (as 'runtime:
+python' of app-sample.yaml), no request is ever queued nor rejected.
+"""
+
+import threading
+import time
+
+# share of global capacity by route priority
+PRIORITIES = {'low': 0.5, 'normal': 0.8, 'high': 1.0}
+
+# max running requests in process
+MAX_INFLIGHT = 100
+
+# max waiting requests in process
+MAX_QUEUED = 100
+
+# max seconds waiting in queue
+QUEUE_TIMEOUT = 2.0
+
+# seconds for Retry-After header of rejected requests
+RETRY_AFTER = 5
+
+
+class Admission(object):
+    """Count running requests, by route"""
+
+    def __init__(self, max_inflight=MAX_INFLIGHT, max_queued=MAX_QUEUED,
+                 queue_timeout=QUEUE_TIMEOUT, retry_after=RETRY_AFTER):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        # route -> running requests
+        self._routes = {}
+        # priority share -> waiting requests
+        self._waiting = {}
+
+    def acquire(self, route, route_limit=None, priority='normal',
+                timeout=None):
+        """Admit a request, waiting if needed
+
+        Args:
+            route: request URL from config
+            route_limit: max running requests of route, None for no limit
+            priority: 'low', 'normal' or 'high'
+            timeout: max seconds to wait, if less than queue_timeout
+
+        Returns:
+            True if admitted (call release at end), False if rejected
+        """
+        share = PRIORITIES[priority]
+        if timeout is None or timeout > self.queue_timeout:
+            timeout = self.queue_timeout
+        self._cond.acquire()
+        try:
+            if not self._can_run(route, route_limit, share):
+                if self.queued >= self.max_queued * share or timeout <= 0:
+                    return False
+                if not self._wait(route, route_limit, share, timeout):
+                    return False
+            self.inflight += 1
+            self._routes[route] = self._routes.get(route, 0) + 1
+            return True
+        finally:
+            self._cond.release()
+
+    def release(self, route):
+        """End of an admitted request"""
+        self._cond.acquire()
+        try:
+            self.inflight -= 1
+            self._routes[route] -= 1
+            if not self._routes[route]:
+                del self._routes[route]
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+    def load(self):
+        """Running requests, relative to capacity"""
+        return float(self.inflight) / self.max_inflight
+
+    def overloaded(self, priority='low'):
+        """True if a new request of priority would wait"""
+        return self.queued > 0 or self.load() >= PRIORITIES[priority]
+
+    def _can_run(self, route, route_limit, share):
+        if self.inflight >= self.max_inflight * share:
+            return False
+        if route_limit and self._routes.get(route, 0) >= route_limit:
+            return False
+        # requests of higher priority go first
+        for (other, count) in self._waiting.items():
+            if other > share and count:
+                return False
+        return True
+
+    def _wait(self, route, route_limit, share, timeout):
+        """Wait (lock held) until request can run, False on timeout"""
+        deadline = time.time() + timeout
+        self.queued += 1
+        self._waiting[share] = self._waiting.get(share, 0) + 1
+        try:
+            while not self._can_run(route, route_limit, share):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+        finally:
+            self.queued -= 1
+            self._waiting[share] -= 1
+            # lower priority requests may run now
+            self._cond.notifyAll()
+
+
+# admission of all requests in process
+admission = Admission()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+canary.py
+
+Versions of a route forwards, with traffic weights, for gradual rollout
+of new destinations (and instant rollback by changing weights).
+
+Version of a request is chosen by hash of a request attribute (header
+or parameter 'canary_key', else remote address) : same caller always
+get same version, no random nor shared state.
+"""
+
+import bisect
+import zlib
+
+
+class Canary(object):
+    """Choose version of a route"""
+
+    __slots__ = ('key', 'names', 'forwards', '_bounds', '_total')
+
+    def __init__(self, key, versions):
+        """
+        Args:
+            key: header or parameter hashed, None for remote address
+            versions: list of (name, weight, tuple of ForwardPlan)
+        """
+        self.key = key
+        self.names = tuple([name for (name, weight, forwards) in versions])
+        self.forwards = tuple([forwards
+                               for (name, weight, forwards) in versions])
+        bounds = []
+        total = 0
+        for (name, weight, forwards) in versions:
+            if weight < 0:
+                raise ValueError("negative weight for version %s" % name)
+            total += weight
+            bounds.append(total)
+        if not total:
+            raise ValueError("no weight for versions %s" %
+                             ", ".join(self.names))
+        self._bounds = tuple(bounds)
+        self._total = total
+
+    def choose(self, request):
+        """Return (version name, tuple of ForwardPlan) of request"""
+        value = None
+        if self.key:
+            value = request.headers.get(self.key) or \
+                    request.params.get(self.key)
+        if not value:
+            value = request.remote_addr or ''
+        return self.version(value)
+
+    def version(self, value):
+        """Return (version name, tuple of ForwardPlan) of a key value"""
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        point = (zlib.crc32(value) & 0xffffffff) % self._total
+        # first version whose bound is above point (skip 0 weights)
+        i = bisect.bisect_right(self._bounds, point)
+        return (self.names[i], self.forwards[i])
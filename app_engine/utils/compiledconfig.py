@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+compiledconfig.py
+
+Precompiled config written by compile_config.py : routes checked, with
+default values merged, pickled with md5 of source yaml files.
+
+Loading it skip yaml parsing and checks. It is only used if source
+files did not change since compilation : when one change later, config
+is loaded from source files (see CompiledOptions.reload).
+"""
+
+import cPickle as pickle
+import hashlib
+import logging
+import os
+import UserDict
+
+from routeplan import compile_routes
+from interpolation import interpolator
+
+# format of compiled file
+FORMAT = 1
+
+
+def digests(config_files, base_dir):
+    """md5 of each config file content"""
+    result = {}
+    for config_file in config_files:
+        source = open(os.path.join(base_dir, config_file), 'rb')
+        try:
+            result[config_file] = hashlib.md5(source.read()).hexdigest()
+        finally:
+            source.close()
+    return result
+
+
+def save(path, routes, sources):
+    """Write compiled config
+
+    Args:
+        path: compiled file, replaced
+        routes: dict of route config with default values, by URL
+        sources: md5 of source files (see digests)
+    """
+    compiled = open(path + '.tmp', 'wb')
+    try:
+        pickle.dump({'format': FORMAT, 'sources': sources, 'routes': routes},
+                    compiled, pickle.HIGHEST_PROTOCOL)
+    finally:
+        compiled.close()
+    os.rename(path + '.tmp', path)
+
+
+def load(path, config_files, base_dir, fallback=None):
+    """Read compiled config
+
+    Args:
+        path: compiled file
+        config_files: yaml files config must be compiled from
+        fallback: function(previous routes) loading config from source
+            files, used when they change (see CompiledOptions.reload)
+
+    Returns:
+        CompiledOptions, or None if absent or older than source files
+    """
+    try:
+        compiled = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        content = pickle.load(compiled)
+    finally:
+        compiled.close()
+    if content.get('format') != FORMAT:
+        logging.warning("compiled config %s ignored: old format", path)
+        return None
+    sources = content['sources']
+    if sorted(sources.keys()) != sorted(config_files):
+        logging.warning("compiled config %s ignored: other files", path)
+        return None
+    try:
+        current = digests(sources.keys(), base_dir)
+    except IOError:
+        current = None
+    if current != sources:
+        logging.warning("compiled config %s ignored: config changed", path)
+        return None
+    return CompiledOptions(content['routes'], sources, base_dir, fallback)
+
+
+class CompiledOptions(UserDict.IterableUserDict):
+    """Routes of a compiled config, used like YamlOptions"""
+
+    def __init__(self, routes, sources=None, base_dir='', fallback=None):
+        """
+        Args:
+            routes: dict of route config with default values, by URL
+            sources: md5 of source files (see digests)
+            fallback: function(previous routes) loading config from
+                source files (ex: YamlOptions), None to keep compiled one
+        """
+        UserDict.IterableUserDict.__init__(self)
+        self.sources = sources or {}
+        self.base_dir = base_dir
+        self._routes = routes
+        self._fallback = fallback
+        # config loaded from source files, once one changed
+        self._options = None
+        self._stats = self._stat()
+        # default values already merged
+        self.data = compile_routes(routes, {})
+
+    def match(self, path):
+        """Find route of request path, see RouteIndex.match"""
+        return self.data.match(path)
+
+    def reload(self):
+        """Check source files and secrets
+
+        When a source file changed, config is loaded from source files
+        by fallback (unchanged routes are kept), and reloaded by it
+        since.
+
+        Returns:
+            True if config changed
+        """
+        if self._options is not None:
+            changed = self._options.reload()
+            self.data = self._options.data
+            return changed
+        stats = self._stat()
+        if stats != self._stats and self._fallback is not None:
+            try:
+                changed = digests(self.sources.keys(),
+                                  self.base_dir) != self.sources
+            except IOError:
+                changed = True
+            if changed:
+                logging.warning("config changed since compilation, "
+                                "compiled config ignored")
+                self._options = self._fallback(self.data)
+                self.data = self._options.data
+                return True
+            self._stats = stats
+        if interpolator.changed():
+            # routes using changed secret are compiled again
+            self.data = compile_routes(self._routes, {}, self.data)
+            return True
+        return False
+
+    def paths(self):
+        """Paths of config files"""
+        if self._options is not None:
+            return self._options.paths()
+        return [os.path.join(self.base_dir, name)
+                for name in sorted(self.sources.keys())]
+
+    def _stat(self):
+        """(mtime, size) of source files, None for missing ones"""
+        stats = []
+        for path in self.paths():
+            try:
+                st = os.stat(path)
+            except OSError:
+                stats.append(None)
+            else:
+                stats.append((st.st_mtime, st.st_size))
+        return stats
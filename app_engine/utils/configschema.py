@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+configschema.py
+
+Check route config (from yaml files) before using it : unknown keys,
+missing url, bad types or method names... All errors are reported,
+not only first one.
+"""
+
+from Chainmap import Chainmap
+from routeplan import compile_route, route_forwards
+from admission import PRIORITIES
+
+# HTTP methods of request and forward
+METHODS = frozenset(['GET', 'POST', 'PUT', 'DELETE', 'HEAD'])
+
+_string = (str, unicode)
+_number = (int, long, float)
+_list = (list, tuple)
+
+# key -> allowed types (None is always allowed : not set)
+ROUTE_KEYS = {
+    'url': _string,
+    'methods': _list,
+    'remote_addr': _list,
+    'forwards': _list,
+    'idempotency_key': _string,
+    'idempotency_store': _string,
+    'idempotency_ttl': _number,
+    'priority': _string,
+    'max_inflight': (int, long),
+    'deadline_header': _string,
+    'versions': _list,
+    'canary_key': _string,
+}
+
+VERSION_KEYS = {
+    'name': _string,
+    'weight': (int, long),
+    'forwards': _list,
+}
+
+FORWARD_KEYS = {
+    'url': _string,
+    'method': _string,
+    'login': _string,
+    'password': _string,
+    'headers': (dict, ),
+    'follow_redirects': (bool, ),
+    'remove': _list,
+    'only': _list,
+    'default': (dict, ),
+    'set': (dict, ),
+    'pool': _list,
+    'balance': _string,
+    'balance_key': _string,
+    'fallbacks': _list,
+    'failover_status': _list,
+    'failover_delay': _number,
+    'shadow': (bool, ),
+    'shadow_percent': _number,
+    'cache_ttl': _number,
+    'cache_max_items': (int, long),
+    'dead_letter': (bool, ),
+    'delay': _number,
+    'batch_every': _number,
+    'order_by': _string,
+    'deadline_min': _number,
+}
+
+
+def validate(options, config_default):
+    """Check all routes
+
+    Args:
+        options: dict of route config indexed by URL (from yaml files)
+        config_default: default route config ('::dummy::' item)
+
+    Returns:
+        list of error messages, empty if config is valid
+    """
+    errors = []
+    for url in sorted(options.keys()):
+        errors.extend(validate_route(options[url], config_default))
+    return errors
+
+
+def validate_route(config_request, config_default):
+    """Check a route, return list of error messages"""
+    url = config_request.get('url')
+    where = "route %s" % url
+    errors = _check_keys(where, config_request, ROUTE_KEYS)
+    if not url:
+        errors.append("%s: missing url" % where)
+    config = Chainmap(config_request, config_default)
+    errors.extend(_check_methods(where, config.get('methods') or ()))
+    if config.get('priority') not in (None, ) + tuple(PRIORITIES):
+        errors.append("%s: unknown priority %r" %
+                      (where, config['priority']))
+    if config.get('idempotency_store') not in (None, 'local', 'memcache'):
+        errors.append("%s: unknown idempotency_store %r" %
+                      (where, config['idempotency_store']))
+    versions = config_request.get('versions')
+    if versions and isinstance(versions, _list):
+        if config_request.get('forwards'):
+            errors.append("%s: forwards are set by versions" % where)
+        for version in versions:
+            if not isinstance(version, dict) or not version.get('name') or \
+               not version.get('forwards'):
+                errors.append("%s: version %r needs name and forwards" %
+                              (where, version))
+                return errors
+            version_errors = _check_keys("%s, version %s" %
+                                         (where, version['name']),
+                                         version, VERSION_KEYS)
+            if version_errors:
+                return errors + version_errors
+        forwards = route_forwards(config_request)
+    else:
+        forwards = config_request.get('forwards')
+    if not forwards:
+        errors.append("%s: no forwards" % where)
+        return errors
+    if not isinstance(forwards, _list):
+        return errors
+
+    config_forward_default = config_default.get('forwards', [{}])[0]
+    for (index, config_forward) in enumerate(forwards):
+        where = "route %s, forward %d" % (url, index)
+        if not isinstance(config_forward, dict):
+            errors.append("%s: not a mapping" % where)
+            continue
+        errors.extend(_check_keys(where, config_forward, FORWARD_KEYS))
+        config = Chainmap(config_forward, config_forward_default)
+        if not config.get('url') and not config.get('pool'):
+            errors.append("%s: missing url (or pool)" % where)
+        errors.extend(_check_methods(where, [config.get('method')]))
+
+    if not errors:
+        # errors found by compiling (ex: bad URL template)
+        try:
+            compile_route(config_request, config_default)
+        except Exception, e:
+            errors.append("route %s: %s: %s" % (url, e.__class__.__name__, e))
+    return errors
+
+
+def _check_keys(where, config, known):
+    errors = []
+    for key in sorted(config.keys()):
+        if key not in known:
+            errors.append("%s: unknown key %r" % (where, key))
+        elif config[key] is not None and \
+             not isinstance(config[key], known[key]):
+            errors.append("%s: bad type for %r: %r" %
+                          (where, key, config[key]))
+    return errors
+
+
+def _check_methods(where, methods):
+    return ["%s: unknown method %r" % (where, method)
+            for method in methods if method not in METHODS]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+deadletter.py
+
+Store forwards who failed for good (after failover), so they can be
+replayed later (see replay.py).
+
+Only what is needed to replay is stored : route, forward index in route
+config (for headers, credentials and 'set' parameters, never stored),
+fingerprint of forward destination (config of a changed forward is not
+used), destination, HTTP method and encoded parameters.
+"""
+
+import cgi
+import logging
+
+from google.appengine.ext import db
+
+from urlforward import encode_param
+
+
+class DeadLetter(db.Model):
+    """A failed forward"""
+    route = db.StringProperty(required=True)
+    forward = db.IntegerProperty(required=True)
+    fingerprint = db.StringProperty() # see routeplan.forward_fingerprint
+    url = db.StringProperty(required=True)
+    method = db.StringProperty(required=True)
+    payload = db.TextProperty()
+    status = db.IntegerProperty() # None for connection error
+    error = db.StringProperty()
+    created = db.DateTimeProperty(auto_now_add=True)
+
+    def param(self):
+        """Return forwarded parameters as a list of (name, value)"""
+        return cgi.parse_qsl(self.payload or '', keep_blank_values=True)
+
+
+def record(route, forward, fingerprint, url, method, param, status_code,
+           error=None):
+    """Store a failed forward, never raise
+
+    Args:
+        route: request URL from config
+        forward: index of forward in route config
+        fingerprint: fingerprint of forward config
+        url: destination URL (template filled)
+        method: HTTP method
+        param: forwarded parameters mapping, without 'set' ones
+        status_code: last HTTP status code, None for connection error
+        error: error message, default for connection error
+    """
+    if status_code is None and error is None:
+        error = "connection error"
+    payload = encode_param(param)
+    try:
+        DeadLetter(route=route, forward=forward, fingerprint=fingerprint,
+                   url=url, method=method,
+                   payload=db.Text(payload, encoding='utf-8'),
+                   status=status_code, error=error).put()
+    except Exception, e:
+        # losing it is better than failing the request
+        logging.error("dead letter for %s lost: %s", url, e)
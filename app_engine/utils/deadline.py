@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+deadline.py
+
+Time budget of a request, sent by caller in a header (seconds it will
+wait for response), ex: X-Request-Timeout: 2.5
+
+Parsed once when request comes in, then remaining time is given to
+each forward (as urlfetch deadline and in same header), at most
+FETCH_MAX_DEADLINE.
+"""
+
+import time
+
+# max urlfetch deadline of a request (seconds), longer is an error
+FETCH_MAX_DEADLINE = 10
+
+_INFINITY = 1e300 * 1e300
+
+
+class Deadline(object):
+    """Time when caller give up"""
+
+    __slots__ = ('expire', )
+
+    def __init__(self, timeout, now=None):
+        """
+        Args:
+            timeout: seconds from now
+        """
+        if now is None:
+            now = time.time()
+        self.expire = now + timeout
+
+    def remaining(self, now=None):
+        """Seconds left, 0 if expired"""
+        if now is None:
+            now = time.time()
+        return max(0.0, self.expire - now)
+
+    def fetch_deadline(self, now=None):
+        """urlfetch deadline of a forward : remaining time, at most
+        FETCH_MAX_DEADLINE
+        """
+        return min(self.remaining(now), FETCH_MAX_DEADLINE)
+
+    def header(self, name, now=None):
+        """HTTP header propagating time given to forward"""
+        return (name, "%.3f" % self.fetch_deadline(now))
+
+
+def parse(headers, name, now=None):
+    """Return Deadline from header name, None if absent or invalid
+
+    Args:
+        headers: HTTP headers mapping of request
+        name: name of header holding timeout (seconds)
+    """
+    if not name:
+        return None
+    value = headers.get(name)
+    if not value:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    # also false for nan
+    if not 0 <= timeout < _INFINITY:
+        return None
+    return Deadline(timeout, now)
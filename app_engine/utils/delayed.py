@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+delayed.py
+
+Delayed forwards, delivered later by App Engine task queue
+(persistent, retried on failure, see tasks.py) :
+ - delay : seconds to wait before delivery (cool-off)
+ - batch_every : deliver at next multiple of seconds (ex: 60 for
+     all forwards of a minute together)
+"""
+
+import datetime
+import time
+
+try:
+    from google.appengine.api import taskqueue
+except ImportError:
+    from google.appengine.api.labs import taskqueue
+
+from urlforward import encode_param
+
+# URL of task handler (see tasks.py)
+TASK_URL = '/_tasks/forward'
+
+# queue for delayed forward (see queue.yaml)
+QUEUE_NAME = 'delayed'
+
+
+def eta(delay=0, batch_every=None, now=None):
+    """Return delivery time (timestamp)
+
+    Args:
+        delay: seconds to wait
+        batch_every: round up to next multiple of seconds
+    """
+    if now is None:
+        now = time.time()
+    when = now + delay
+    if batch_every:
+        when = (int(when) // batch_every + 1) * batch_every
+    return when
+
+
+def defer(route, forward, fingerprint, url, param, delay=0,
+          batch_every=None, now=None):
+    """Queue a forward
+
+    Args:
+        route: request URL from config
+        forward: index of forward in route config
+            (headers, credentials and 'set' parameters are taken from
+            config at delivery)
+        fingerprint: fingerprint of forward config (dropped at
+            delivery if forward changed)
+        url: destination URL (template filled)
+        param: forwarded parameters mapping, without 'set' ones
+    """
+    payload = encode_param(param)
+    when = datetime.datetime.utcfromtimestamp(eta(delay, batch_every, now))
+    taskqueue.Task(url=TASK_URL,
+                   params={'route': route,
+                           'forward': str(forward),
+                           'fingerprint': fingerprint,
+                           'url': url,
+                           'payload': payload},
+                   eta=when).add(QUEUE_NAME)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+failover.py
+
+Ordered fallback destinations for a forward, tried when previous one fail
+(connection error, timeout or configured HTTP status code).
+
+Health of destinations is remembered by the process : a destination who
+failed is tried last, until retry delay (failover_delay) expire, then
+next request trying it probe it.
+"""
+
+import threading
+import time
+
+from urltemplate import UrlTemplate
+
+# status codes who trigger failover (if not set in config)
+FAILOVER_STATUS = (500, 502, 503, 504)
+
+# seconds before probing again a failed destination
+RETRY_DELAY = 30
+
+
+class Health(object):
+    """Remember failed destinations, shared by all requests of process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # destination -> time to probe it again
+        self._down = {}
+
+    def is_down(self, key, now=None):
+        """True if key is known down and must not be probed now"""
+        until = self._down.get(key)
+        if until is None:
+            return False
+        if now is None:
+            now = time.time()
+        return now < until
+
+    def probe(self, key, delay=RETRY_DELAY, now=None):
+        """Called before trying key : if key is down and can be probed,
+        only this request probe it, others wait an other delay
+        """
+        if key not in self._down:
+            return
+        if now is None:
+            now = time.time()
+        self._lock.acquire()
+        try:
+            if now >= self._down.get(key, now + delay):
+                self._down[key] = now + delay
+        finally:
+            self._lock.release()
+
+    def mark_down(self, key, delay=RETRY_DELAY, now=None):
+        if now is None:
+            now = time.time()
+        self._down[key] = now + delay
+
+    def mark_up(self, key):
+        self._down.pop(key, None)
+
+    def clear(self):
+        self._down.clear()
+
+
+# health of all destinations in process
+health = Health()
+
+
+class Failover(object):
+    """Order destination of a forward, according their health"""
+
+    def __init__(self, fallbacks, status=FAILOVER_STATUS, delay=RETRY_DELAY,
+                 shown=None):
+        """
+        Args:
+            fallbacks: list of url (can be template) tried in order
+            status: HTTP status code who trigger failover
+            delay: seconds before probing again a failed destination
+            shown: fallbacks shown instead of fallbacks (see UrlTemplate)
+        """
+        if shown is None:
+            shown = fallbacks
+        self.fallbacks = tuple([UrlTemplate(url, shown_url)
+                                for (url, shown_url) in zip(fallbacks, shown)])
+        self.status = frozenset([int(code) for code in status])
+        self.delay = delay
+
+    def order(self, primary, now=None):
+        """Return url templates to try : primary then fallbacks,
+        known down destinations are put at end
+        """
+        up = []
+        down = []
+        for url_template in (primary, ) + self.fallbacks:
+            if health.is_down(url_template.template, now):
+                down.append(url_template)
+            else:
+                up.append(url_template)
+        return up + down
+
+    def attempt(self, url_template, now=None):
+        """Called before trying a destination (see Health.probe)"""
+        health.probe(url_template.template, self.delay, now)
+
+    def failed(self, status_code):
+        """True if status_code (None for connection error) need failover"""
+        return status_code is None or status_code in self.status
+
+    def mark(self, url_template, status_code):
+        """Remember health of destination after a try"""
+        if self.failed(status_code):
+            health.mark_down(url_template.template, self.delay)
+        else:
+            health.mark_up(url_template.template)
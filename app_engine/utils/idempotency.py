@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+idempotency.py
+
+Remember outcome of requests by idempotency key (ex: a delivery ID sent
+by webhook sender), so a resent request is answered without forwarding
+it again.
+
+Key is reserved before forwarding (see reserve) : a request resent while
+first one is still forwarded is answered IN_PROGRESS, never forwarded.
+
+Stores :
+ - local : in process, bounded LRU cache with TTL
+ - memcache : App Engine memcache, shared by all instances
+"""
+
+import hashlib
+import threading
+
+from lrucache import LRUCache
+
+# default time to remember an outcome (seconds)
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# default max remembered outcomes by route (local store)
+IDEMPOTENCY_MAX_ITEMS = 10000
+
+# default max sum of remembered body size by route (local store)
+IDEMPOTENCY_MAX_SIZE = 1024 * 1024
+
+# max time a key stay reserved, if request never end (seconds)
+RESERVE_TTL = 120
+
+# value of a reserved key, until outcome is recorded
+IN_PROGRESS = 'in progress'
+
+# seconds before resending a request in progress (Retry-After header)
+IN_PROGRESS_RETRY_AFTER = 5
+
+
+class LocalStore(object):
+    """Outcomes stored in process (one store by route)"""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_items=IDEMPOTENCY_MAX_ITEMS,
+                 max_size=IDEMPOTENCY_MAX_SIZE, prefix=''):
+        self._cache = LRUCache(max_items, ttl, max_size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def add(self, key, value, ttl):
+        """Set value only if key is unknown, return True if set"""
+        self._lock.acquire()
+        try:
+            if key in self._cache:
+                return False
+            self._cache.set(key, value, ttl=ttl)
+            return True
+        finally:
+            self._lock.release()
+
+    def put(self, key, outcome):
+        self._cache.set(key, outcome, size=len(outcome[1]))
+
+    def delete(self, key):
+        self._cache.pop(key)
+
+
+class MemcacheStore(object):
+    """Outcomes stored in App Engine memcache, shared by all routes :
+    keys are prefixed by route
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, namespace='idempotency',
+                 prefix=''):
+        from google.appengine.api import memcache
+        self._memcache = memcache
+        self.ttl = ttl
+        self.namespace = namespace
+        self.prefix = prefix
+
+    def get(self, key):
+        return self._memcache.get(self._key(key), namespace=self.namespace)
+
+    def add(self, key, value, ttl):
+        """Set value only if key is unknown, return True if set"""
+        return self._memcache.add(self._key(key), value, time=ttl,
+                                  namespace=self.namespace)
+
+    def put(self, key, outcome):
+        self._memcache.set(self._key(key), outcome, time=self.ttl,
+                           namespace=self.namespace)
+
+    def delete(self, key):
+        self._memcache.delete(self._key(key), namespace=self.namespace)
+
+    def _key(self, key):
+        return _short(self.prefix + key)
+
+
+def _short(key):
+    """memcache keys are limited to 250 bytes"""
+    if len(key) > 200:
+        return hashlib.md5(key).hexdigest()
+    return key
+
+
+STORES = {'local': LocalStore, 'memcache': MemcacheStore}
+
+
+class Idempotency(object):
+    """Idempotency key of a route"""
+
+    def __init__(self, name, store='local', ttl=IDEMPOTENCY_TTL, route=''):
+        """
+        Args:
+            name: HTTP header or request parameter holding key
+            store: 'local' or 'memcache'
+            ttl: time to remember an outcome (seconds)
+            route: request URL from config, keys of other routes never
+                match
+        """
+        if store not in STORES:
+            raise ValueError("unknown idempotency store %r" % store)
+        self.name = name
+        self.store = STORES[store](ttl=ttl, prefix=route + '\n')
+
+    def key(self, request):
+        """Return idempotency key of webob request, None if not set"""
+        key = request.headers.get(self.name)
+        if key is None:
+            key = request.params.get(self.name)
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return key
+
+    def get(self, key):
+        """Return recorded (status_code, body), None if unknown key"""
+        return self.store.get(key)
+
+    def reserve(self, key):
+        """Mark key as in progress, before forwarding request
+
+        Returns:
+            None if reserved (request must be forwarded), else recorded
+            (status_code, body), or IN_PROGRESS if a request with same
+            key is forwarded
+        """
+        if self.store.add(key, IN_PROGRESS, RESERVE_TTL):
+            return None
+        return self.store.get(key) or IN_PROGRESS
+
+    def put(self, key, status_code, body):
+        """Record outcome of request with key"""
+        self.store.put(key, (status_code, body))
+
+    def release(self, key):
+        """Forget reserved key, without outcome (sender should retry)"""
+        self.store.delete(key)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+interpolation.py
+
+Secrets out of config files : a string value of config can hold
+references, resolved when routes are compiled (never by request) :
+ - ${NAME} : environment variable NAME
+ - ${file:secrets/ftp.txt} : content of file (relative to application
+   directory), without ending new line
+ - $${...} : literal ${...}
+
+ex:
+    password: ${file:secrets/hooks-password}
+
+Secret files are read again only when changed (see changed), files
+no more referenced after a full resolve (see begin and end) are
+forgotten.
+Error messages only give reference, never resolved value. Forward URLs
+are shown in responses and logs from config masked (see mask) : only
+tasks and dead letters keep a resolved URL, as they are sent to it.
+"""
+
+import os
+import re
+import threading
+
+_REFERENCE = re.compile(r'\$(\$?)\{([^}]*)\}')
+
+# shown instead of a resolved value
+MASK = '***'
+
+# application directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Interpolator(object):
+    """Resolve references in config items"""
+
+    def __init__(self, base_dir=BASE_DIR, environ=None):
+        self.base_dir = base_dir
+        if environ is None:
+            environ = os.environ
+        self.environ = environ
+        self._lock = threading.Lock()
+        # path -> (stat, content)
+        self._files = {}
+        # paths read since begin(), None out of a full resolve
+        self._read = None
+
+    def resolve(self, item):
+        """Return copy of item (dict, list...) with references resolved
+
+        Raises:
+            ValueError: if a reference can't be resolved
+        """
+        return _substitute(item, self._replace)
+
+    def begin(self):
+        """Start resolve of all routes"""
+        self._lock.acquire()
+        try:
+            self._read = set()
+        finally:
+            self._lock.release()
+
+    def end(self):
+        """End resolve of all routes : forget files not read since begin"""
+        self._lock.acquire()
+        try:
+            if self._read is not None:
+                for path in self._files.keys():
+                    if path not in self._read:
+                        del self._files[path]
+            self._read = None
+        finally:
+            self._lock.release()
+
+    def changed(self):
+        """True if a secret file changed since read"""
+        for (path, (stat, content)) in self._files.items():
+            if _stat(path) != stat:
+                return True
+        return False
+
+    def _replace(self, match):
+        (escape, reference) = match.groups()
+        if escape:
+            return '${%s}' % reference
+        if reference.startswith('file:'):
+            return self._file(reference[5:])
+        if reference not in self.environ:
+            raise ValueError("undefined environment variable %s" % reference)
+        return self.environ[reference]
+
+    def _file(self, name):
+        path = os.path.join(self.base_dir, name)
+        stat = _stat(path)
+        if stat is None:
+            raise ValueError("missing secret file %s" % name)
+        self._lock.acquire()
+        try:
+            if self._read is not None:
+                self._read.add(path)
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == stat:
+                return cached[1]
+            secret = open(path)
+            try:
+                content = secret.read().rstrip('\r\n')
+            finally:
+                secret.close()
+            self._files[path] = (stat, content)
+            return content
+        finally:
+            self._lock.release()
+
+
+def mask(item):
+    """Return copy of item (dict, list...) with references replaced by
+    MASK, to be shown instead of resolved item
+    """
+    return _substitute(item, _mask)
+
+
+def _mask(match):
+    (escape, reference) = match.groups()
+    if escape:
+        return '${%s}' % reference
+    return MASK
+
+
+def _substitute(item, replace):
+    """Copy of item with references replaced by replace(match)"""
+    if isinstance(item, dict):
+        return dict([(key, _substitute(value, replace))
+                     for (key, value) in item.iteritems()])
+    if isinstance(item, (list, tuple)):
+        return [_substitute(value, replace) for value in item]
+    if isinstance(item, basestring) and '${' in item:
+        return _REFERENCE.sub(replace, item)
+    return item
+
+
+def _stat(path):
+    """(mtime, size) of file, None if missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+# resolve references of all compiled routes
+interpolator = Interpolator()
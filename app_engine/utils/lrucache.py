@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+lrucache.py
+
+Bounded mapping : least recently used items are evicted when full
+(count of items or sum of item sizes), items can expire after a TTL.
+All operations are O(1).
+"""
+
+import threading
+import time
+
+# index in linked list node
+PREV, NEXT, KEY, VALUE, EXPIRE, SIZE = range(6)
+
+_marker = object()
+
+
+class LRUCache(object):
+    """Least recently used cache, with optional TTL and size limit
+
+    Usage:
+        cache = LRUCache(max_items=1000, ttl=60)
+        cache.set(key, value)
+        value = cache.get(key) # None if absent or expired
+    """
+
+    def __init__(self, max_items=1000, ttl=None, max_size=None):
+        """
+        Args:
+            max_items: max number of items
+            ttl: default time to live of items in seconds, None for ever
+            max_size: max sum of items size (see set), None for no limit
+        """
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._map = {}
+        # circular doubly linked list, root.NEXT is most recently used
+        self._root = root = [None, None, None, None, None, 0]
+        root[PREV] = root[NEXT] = root
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, key):
+        return self.get(key, _marker, touch=False) is not _marker
+
+    def get(self, key, default=None, now=None, touch=True):
+        """Return value for key, default if absent or expired
+
+        Args:
+            touch: if false, don't mark item as recently used
+                (nor count it in hits / misses)
+        """
+        self._lock.acquire()
+        try:
+            node = self._map.get(key)
+            if node is None:
+                if touch:
+                    self.misses += 1
+                return default
+            if node[EXPIRE] is not None:
+                if now is None:
+                    now = time.time()
+                if now >= node[EXPIRE]:
+                    self._remove(node)
+                    if touch:
+                        self.misses += 1
+                    return default
+            if touch:
+                self._unlink(node)
+                self._link(node)
+                self.hits += 1
+            return node[VALUE]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value, ttl=_marker, size=0, now=None):
+        """Store value for key
+
+        Args:
+            ttl: time to live in seconds, default to cache ttl
+            size: size of item, counted for max_size
+        """
+        if ttl is _marker:
+            ttl = self.ttl
+        expire = None
+        if ttl is not None:
+            if now is None:
+                now = time.time()
+            expire = now + ttl
+        if self.max_size is not None and size > self.max_size:
+            # never fit
+            self.pop(key)
+            return
+        self._lock.acquire()
+        try:
+            node = self._map.get(key)
+            if node is not None:
+                self._remove(node)
+            node = [None, None, key, value, expire, size]
+            self._map[key] = node
+            self._link(node)
+            self.size += size
+            while (len(self._map) > self.max_items or
+                   (self.max_size is not None and self.size > self.max_size)):
+                self._remove(self._root[PREV])
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def pop(self, key, default=None):
+        self._lock.acquire()
+        try:
+            node = self._map.get(key)
+            if node is None:
+                return default
+            self._remove(node)
+            return node[VALUE]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._map.clear()
+            self._root[PREV] = self._root[NEXT] = self._root
+            self.size = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return dict of counters"""
+        return {'items': len(self._map),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    # =====================
+    # = Linked list nodes =
+    # =====================
+
+    def _link(self, node):
+        root = self._root
+        node[PREV] = root
+        node[NEXT] = root[NEXT]
+        root[NEXT][PREV] = node
+        root[NEXT] = node
+
+    def _unlink(self, node):
+        node[PREV][NEXT] = node[NEXT]
+        node[NEXT][PREV] = node[PREV]
+
+    def _remove(self, node):
+        self._unlink(node)
+        del self._map[node[KEY]]
+        self.size -= node[SIZE]
+
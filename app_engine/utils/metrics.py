@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+metrics.py
+
+In process counters, shared by all requests of the process.
+
+Names are dotted strings, ex: 'shadow.sent' or 'shadow.status.200'
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def incr(name, value=1):
+    """Add value to counter name"""
+    _lock.acquire()
+    try:
+        _counters[name] = _counters.get(name, 0) + value
+    finally:
+        _lock.release()
+
+
+def timing(name, seconds):
+    """Count an event of name and add its duration"""
+    _lock.acquire()
+    try:
+        _counters[name + '.count'] = _counters.get(name + '.count', 0) + 1
+        _counters[name + '.time'] = _counters.get(name + '.time', 0) + seconds
+    finally:
+        _lock.release()
+
+
+def get(name, default=0):
+    return _counters.get(name, default)
+
+
+def snapshot(prefix=''):
+    """Return a copy of counters who start with prefix"""
+    _lock.acquire()
+    try:
+        return dict([(name, value) for (name, value) in _counters.items()
+                     if name.startswith(prefix)])
+    finally:
+        _lock.release()
+
+
+def reset():
+    _lock.acquire()
+    try:
+        _counters.clear()
+    finally:
+        _lock.release()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+ordered.py
+
+Ordered forwards : events of a forward with same key (value of the
+'order_by' request parameter) are delivered strictly in sequence,
+events with different keys are delivered in parallel.
+
+Each key is a partition (datastore entity group) holding its pending
+events, drained by one task at a time (see tasks.py). A slow or failing
+key only delay its own events.
+
+Events of a key are appended in transactions of its entity group, so a
+key sustain about one event by second (more by bursts). Appending fails
+after ENQUEUE_RETRIES conflicting transactions : forward is then stored
+as dead letter (see main.WSGIForwardsHandler.defer).
+"""
+
+import cgi
+import hashlib
+
+from google.appengine.ext import db
+
+try:
+    from google.appengine.api import taskqueue
+except ImportError:
+    from google.appengine.api.labs import taskqueue
+
+from urlforward import encode_param
+
+# URL of task handler (see tasks.py)
+TASK_URL = '/_tasks/ordered'
+
+# queue for ordered forwards (see queue.yaml)
+QUEUE_NAME = 'ordered'
+
+# events delivered by a drain task
+BATCH_SIZE = 20
+
+# retries of enqueue transaction on contention (hot key)
+ENQUEUE_RETRIES = 10
+
+
+class Partition(db.Model):
+    """Pending events of a key"""
+    route = db.StringProperty(required=True)
+    forward = db.IntegerProperty(required=True)
+    next_seq = db.IntegerProperty(default=0)
+    draining = db.BooleanProperty(default=False)
+
+
+class OrderedEvent(db.Model):
+    """A pending event, child of its Partition"""
+    seq = db.IntegerProperty(required=True)
+    fingerprint = db.StringProperty() # of forward config when enqueued
+    url = db.StringProperty(required=True)
+    payload = db.TextProperty()
+
+    def param(self):
+        """Return forwarded parameters as a list of (name, value)"""
+        return cgi.parse_qsl(self.payload or '', keep_blank_values=True)
+
+
+def partition_name(route, forward, key):
+    """Key name of Partition"""
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return hashlib.md5("%s\n%d\n%s" % (route, forward, key)).hexdigest()
+
+
+def enqueue(route, forward, fingerprint, key, url, param):
+    """Append an event to partition of key
+
+    Args:
+        route: request URL from config
+        forward: index of forward in route config
+        fingerprint: fingerprint of forward config
+        key: value of order_by parameter
+        url: destination URL (template filled)
+        param: forwarded parameters mapping, without 'set' ones (taken
+            from config at delivery)
+    """
+    name = partition_name(route, forward, key)
+    payload = db.Text(encode_param(param), encoding='utf-8')
+
+    def txn():
+        partition = Partition.get_by_key_name(name)
+        if partition is None:
+            partition = Partition(key_name=name, route=route,
+                                  forward=forward)
+        event = OrderedEvent(parent=db.Key.from_path('Partition', name),
+                             seq=partition.next_seq,
+                             fingerprint=fingerprint, url=url,
+                             payload=payload)
+        partition.next_seq += 1
+        if not partition.draining:
+            partition.draining = True
+            _add_task(name)
+        db.put([partition, event])
+    db.run_in_transaction_custom_retries(ENQUEUE_RETRIES, txn)
+
+
+def drain(name, deliver, give_up=None):
+    """Deliver pending events of a partition, in order
+
+    Args:
+        name: key name of Partition
+        deliver: function(route, forward, event), True if delivered
+        give_up: function(route, forward, event), called instead of
+            failing when head event can't be delivered (None to retry)
+
+    Retries of a task are only for its head event : after an event is
+    delivered or given up, a failing event is retried in a new task,
+    with its own retries.
+
+    Returns:
+        False if head event failed (task must be retried)
+    """
+    partition = Partition.get_by_key_name(name)
+    if partition is None:
+        return True
+    events = OrderedEvent.all().ancestor(partition).order('seq') \
+                               .fetch(BATCH_SIZE)
+    for (i, event) in enumerate(events):
+        if not deliver(partition.route, partition.forward, event):
+            if i:
+                # continued by a new task
+                break
+            if give_up is None:
+                return False
+            give_up(partition.route, partition.forward, event)
+            event.delete()
+            # next events are delivered by a new task
+            break
+        event.delete()
+
+    def txn():
+        current = Partition.get(partition.key())
+        if OrderedEvent.all().ancestor(current).count(1):
+            # more events, continue in a new task
+            _add_task(name)
+        else:
+            current.draining = False
+            current.put()
+    db.run_in_transaction(txn)
+    return True
+
+
+def _add_task(name):
+    taskqueue.Task(url=TASK_URL,
+                   params={'partition': name}).add(QUEUE_NAME,
+                                                   transactional=True)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+pool.py
+
+Pool of equivalent destinations for a forward, with a balancing strategy :
+ - round_robin : each destination in turn (default)
+ - weighted : each destination in turn, proportionally to its weight
+ - least_outstanding : destination with fewer running requests
+ - ewma : destination with lower (moving average) latency
+ - hash : consistent hashing on a request parameter value
+
+A pool is built once at config load and shared by all requests
+of the process.
+"""
+
+import bisect
+import hashlib
+import itertools
+import threading
+
+from urltemplate import UrlTemplate
+
+# weight of last request latency in moving average
+EWMA_ALPHA = 0.3
+
+# number of points on hash ring for each weight unit
+HASH_REPLICAS = 64
+
+
+class Member(object):
+    """A destination of a pool"""
+
+    __slots__ = ('url', 'url_template', 'weight', 'outstanding', 'latency')
+
+    def __init__(self, url, weight=1, shown=None):
+        self.url = url
+        self.url_template = UrlTemplate(url, shown)
+        self.weight = weight
+        # running requests
+        self.outstanding = 0
+        # moving average of latency (seconds), None until first request
+        self.latency = None
+
+    def __repr__(self):
+        return "Member(%r, %r)" % (self.url_template.shown, self.weight)
+
+
+class Pool(object):
+    """Choose a destination for each forwarded request
+
+    Usage:
+        member = pool.choose(params)
+        pool.acquire(member)
+        try:
+            ...forward to member.url_template...
+        finally:
+            pool.release(member, latency)
+    """
+
+    def __init__(self, members, balance='round_robin', balance_key=None,
+                 shown=None):
+        """
+        Args:
+            members: list of url or {'url': url, 'weight': int}
+            balance: name of strategy (see module doc)
+            balance_key: request parameter used by 'hash' strategy
+            shown: members shown instead of members (see UrlTemplate)
+        """
+        if not members:
+            raise ValueError("empty pool")
+        if balance not in STRATEGIES:
+            raise ValueError("unknown balance strategy %r" % balance)
+        if balance == 'hash' and not balance_key:
+            raise ValueError("'hash' balance need a balance_key")
+        if shown is None:
+            shown = members
+        self.members = tuple([_member(item, shown_item)
+                              for (item, shown_item) in zip(members, shown)])
+        self.balance = balance
+        self.balance_key = balance_key
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._choose = getattr(self, '_choose_' + balance)
+        self._sequence = _weighted_sequence(self.members)
+        (self._ring, self._ring_members) = _hash_ring(self.members)
+
+    def choose(self, params=None, is_down=None):
+        """Return Member to use for a request with params
+
+        Args:
+            params: request parameters
+            is_down: function(member), True if member is known down :
+                next member up is used instead (chosen one if all down)
+        """
+        member = self._choose(params or {})
+        if is_down is None or not is_down(member):
+            return member
+        start = list(self.members).index(member) + 1
+        for other in self.members[start:] + self.members[:start]:
+            if not is_down(other):
+                return other
+        return member
+
+    def acquire(self, member):
+        """Mark start of a request to member"""
+        self._lock.acquire()
+        try:
+            member.outstanding += 1
+        finally:
+            self._lock.release()
+
+    def release(self, member, latency=None):
+        """Mark end of a request to member, taking latency (in seconds)"""
+        self._lock.acquire()
+        try:
+            member.outstanding -= 1
+            if latency is not None:
+                if member.latency is None:
+                    member.latency = latency
+                else:
+                    member.latency += EWMA_ALPHA * (latency - member.latency)
+        finally:
+            self._lock.release()
+
+    # ==============
+    # = Strategies =
+    # ==============
+
+    def _next(self, size):
+        return self._counter.next() % size
+
+    def _choose_round_robin(self, params):
+        return self.members[self._next(len(self.members))]
+
+    def _choose_weighted(self, params):
+        return self._sequence[self._next(len(self._sequence))]
+
+    def _choose_least_outstanding(self, params):
+        # rotate start, so ties don't always go to first member
+        start = self._next(len(self.members))
+        ordered = self.members[start:] + self.members[:start]
+        return min(ordered, key=lambda member: member.outstanding)
+
+    def _choose_ewma(self, params):
+        start = self._next(len(self.members))
+        ordered = self.members[start:] + self.members[:start]
+        # untried member first, account for running requests
+        return min(ordered, key=lambda member:
+                   (member.latency or 0.0) * (member.outstanding + 1))
+
+    def _choose_hash(self, params):
+        if self.balance_key not in params:
+            return self._choose_round_robin(params)
+        value = params[self.balance_key]
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        point = bisect.bisect(self._ring, _hash(value)) % len(self._ring)
+        return self._ring_members[point]
+
+
+STRATEGIES = ('round_robin', 'weighted', 'least_outstanding', 'ewma', 'hash')
+
+
+def _member(item, shown):
+    """Build Member from config item, and item shown"""
+    if isinstance(item, basestring):
+        return Member(item, shown=shown)
+    return Member(item['url'], int(item.get('weight', 1)), shown['url'])
+
+
+def _hash(value):
+    return long(hashlib.md5(value).hexdigest()[:16], 16)
+
+
+def _weighted_sequence(members):
+    """Smooth weighted round robin order (as nginx)
+
+    ex: weights a=5, b=1, c=1 give a a b a c a a (not a a a a a b c)
+    """
+    current = [0] * len(members)
+    total = sum([member.weight for member in members])
+    sequence = []
+    for i in xrange(total):
+        for (j, member) in enumerate(members):
+            current[j] += member.weight
+        best = current.index(max(current))
+        current[best] -= total
+        sequence.append(members[best])
+    return tuple(sequence)
+
+
+def _hash_ring(members):
+    """Consistent hashing ring : (sorted points, member of each point)"""
+    points = []
+    for member in members:
+        for i in xrange(HASH_REPLICAS * member.weight):
+            points.append((_hash("%s#%d" % (member.url, i)), member))
+    points.sort(key=lambda point: point[0])
+    return (tuple([point[0] for point in points]),
+            tuple([point[1] for point in points]))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+responsecache.py
+
+Cache of GET forwards response, keyed by final URL (with query).
+
+A response is reused during its TTL, then revalidated with
+If-None-Match / If-Modified-Since (a 304 response refresh it).
+Only status code and validators are stored, not the body.
+"""
+
+import time
+
+import metrics
+from lrucache import LRUCache
+
+# default max cached responses by forward
+CACHE_MAX_ITEMS = 1000
+
+
+class CacheEntry(object):
+
+    __slots__ = ('status_code', 'etag', 'last_modified', 'size', 'expire')
+
+    def __init__(self, status_code, etag, last_modified, size, expire):
+        self.status_code = status_code
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.expire = expire
+
+
+class ResponseCache(object):
+    """Response cache of a forward"""
+
+    def __init__(self, ttl, max_items=CACHE_MAX_ITEMS):
+        """
+        Args:
+            ttl: seconds a response is used without revalidation
+            max_items: max cached responses
+        """
+        self.ttl = ttl
+        # entries are kept after ttl, for revalidation
+        self._entries = LRUCache(max_items)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+
+    def fetch(self, fetch_param, fetch, now=None):
+        """Return status code of GET request, from cache if possible
+
+        Args:
+            fetch_param: urlfetch.fetch arguments
+            fetch: function doing request (urlfetch.fetch)
+        """
+        if now is None:
+            now = time.time()
+        url = fetch_param['url']
+        entry = self._entries.get(url)
+        if entry is not None:
+            if now < entry.expire:
+                self._count('hits', entry.size)
+                return entry.status_code
+            # conditional request
+            headers = fetch_param['headers']
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        result = fetch(**fetch_param)
+
+        if entry is not None and result.status_code == 304:
+            entry.expire = now + self.ttl
+            self._count('revalidated', entry.size)
+            return entry.status_code
+
+        self._count('misses', 0)
+        if result.status_code == 200:
+            self._entries.set(url, CacheEntry(
+                result.status_code,
+                result.headers.get('ETag'),
+                result.headers.get('Last-Modified'),
+                len(result.content or ''),
+                now + self.ttl))
+        return result.status_code
+
+    def stats(self):
+        """Return dict of counters, with hit ratio"""
+        total = self.hits + self.revalidated + self.misses
+        ratio = 0.0
+        if total:
+            ratio = float(self.hits + self.revalidated) / total
+        return {'items': len(self._entries),
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'hit_ratio': ratio,
+                'bytes_saved': self.bytes_saved}
+
+    def _count(self, name, size):
+        setattr(self, name, getattr(self, name) + 1)
+        self.bytes_saved += size
+        metrics.incr('cache.' + name)
+        if size:
+            metrics.incr('cache.bytes_saved', size)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+routedb.py
+
+Routes in an on-disk index (SQLite), for config with a lot of routes
+(ex: a secret URL by customer). Only pattern routes are loaded at
+start, a route with exact URL is read and compiled at first request,
+then kept in a bounded LRU cache : memory and start time don't grow
+with number of routes.
+
+Build index from yaml files with :
+    python utils/routedb.py routes.db config-default.yaml config.yaml ...
+(first config file override others, can be include directories)
+"""
+
+import cPickle as pickle
+import os
+import sys
+import threading
+
+try:
+    import sqlite3
+except ImportError:
+    # not available on App Engine
+    sqlite3 = None
+
+from lrucache import LRUCache
+from routeindex import RouteIndex, route_kind
+from routeplan import compile_route
+
+# compiled routes kept in memory
+ROUTE_CACHE_ITEMS = 10000
+
+
+def build(db_path, options, config_default):
+    """Write route index
+
+    Args:
+        db_path: SQLite file, replaced
+        options: dict of route config indexed by URL (from yaml files)
+        config_default: default route config ('::dummy::' item)
+    """
+    # check all routes compile before writing
+    for config_request in options.values():
+        compile_route(config_request, config_default)
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute("CREATE TABLE route (url TEXT PRIMARY KEY, "
+                           "exact INTEGER, item BLOB)")
+        connection.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, "
+                           "value BLOB)")
+        connection.execute("INSERT INTO meta VALUES ('default', ?)",
+                           (_dumps(config_default), ))
+        connection.executemany("INSERT INTO route VALUES (?, ?, ?)", [
+            (url, route_kind(url) == 'exact', _dumps(config_request))
+            for (url, config_request) in options.iteritems()])
+        connection.commit()
+    finally:
+        connection.close()
+    # readers never see a partial index
+    os.rename(tmp_path, db_path)
+
+
+class RouteDB(object):
+    """Compiled routes of an index, read on demand
+
+    Usage like YamlOptions : route in db, db[route], db.match(path)
+    """
+
+    def __init__(self, db_path, max_items=ROUTE_CACHE_ITEMS):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._max_items = max_items
+        self._stat = None
+        self._connection = None
+        self.reload()
+
+    def reload(self):
+        """Open index again if replaced (see build)
+
+        Returns:
+            True if index changed
+        """
+        st = os.stat(self.db_path)
+        stat = (st.st_ino, st.st_mtime, st.st_size)
+        if stat == self._stat:
+            return False
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            config_default = _loads(connection.execute(
+                "SELECT value FROM meta WHERE name = 'default'").fetchone()[0])
+            # pattern routes can't be found by key : all loaded
+            patterns = RouteIndex([
+                (url, compile_route(_loads(item), config_default))
+                for (url, item) in connection.execute(
+                    "SELECT url, item FROM route WHERE NOT exact")])
+        except:
+            connection.close()
+            raise
+        self._lock.acquire()
+        try:
+            (previous, self._connection) = (self._connection, connection)
+            self._config_default = config_default
+            self._patterns = patterns
+            self._cache = LRUCache(self._max_items)
+            self._stat = stat
+            # queries run under lock : none use previous index
+            if previous is not None:
+                previous.close()
+        finally:
+            self._lock.release()
+        return True
+
+    def paths(self):
+        return [self.db_path]
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __getitem__(self, url):
+        plan = self.get(url)
+        if plan is None:
+            raise KeyError(url)
+        return plan
+
+    def __len__(self):
+        return self._query("SELECT count(*) FROM route")[0][0]
+
+    def get(self, url, default=None):
+        """Return RoutePlan of config URL, default if not found"""
+        if route_kind(url) != 'exact':
+            return self._patterns.get(url, default)
+        plan = self._cache.get(url)
+        if plan is None:
+            rows = self._query("SELECT item FROM route WHERE url = ?", (url, ))
+            if not rows:
+                return default
+            plan = compile_route(_loads(rows[0][0]), self._config_default)
+            self._cache.set(url, plan)
+        return plan
+
+    def match(self, path):
+        """Find route of request path, see RouteIndex.match"""
+        if route_kind(path) == 'exact':
+            plan = self.get(path)
+            if plan is not None:
+                return (plan, {})
+        return self._patterns.match(path)
+
+    def stats(self):
+        return self._cache.stats()
+
+    def _query(self, sql, args=()):
+        self._lock.acquire()
+        try:
+            return self._connection.execute(sql, args).fetchall()
+        finally:
+            self._lock.release()
+
+
+def _dumps(item):
+    return sqlite3.Binary(pickle.dumps(item, pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(blob):
+    return pickle.loads(str(blob))
+
+
+def main(argv):
+    from yamloptions import ConfigLayers
+
+    if len(argv) < 4:
+        print "usage: %s routes.db config-default.yaml config.yaml ..." % \
+              argv[0]
+        return 1
+    # files, include directories and their defaults, merged as
+    # YamlOptions does
+    layers = ConfigLayers(argv[3:], argv[2], os.getcwd())
+    layers.check()
+    build(argv[1], layers.options, layers.config_default)
+    print "%d routes written to %s" % (len(layers.options), argv[1])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+routeindex.py
+
+Find route of a request path. Request URL of config can be :
+ - exact path : /a_long_secret_url
+ - with {name} segments : "/hooks/{tenant}/event" (quoted in yaml)
+ - prefix : /static/* (rest of path captured as 'path')
+ - regex, starting with ^ : ^/v(?P<version>\\d+)/event$
+
+Exact paths are looked up first in a dict. Segment and prefix routes
+are in a trie of path segments (literal segment before {name}, before
+prefix), so lookup cost grow with path length, not number of routes.
+Regex routes are tried last, combined in a few regex (in URL order,
+each with less than MAX_GROUPS groups).
+
+Captured values are given to forward URL templates.
+"""
+
+import re
+
+# name of capture holding rest of path of a prefix route
+PREFIX_CAPTURE = 'path'
+
+# groups of a regex (Python 2 re can't compile more than 100)
+MAX_GROUPS = 99
+
+_NAMED_GROUP = re.compile(r'\(\?P<[^>]+>')
+
+
+def route_kind(url):
+    """'exact', 'segment' or 'regex'"""
+    if url.startswith('^'):
+        return 'regex'
+    if '{' in url or url.endswith('/*'):
+        return 'segment'
+    return 'exact'
+
+
+class _Node(object):
+    """Trie node of a path segment"""
+
+    __slots__ = ('children', 'param', 'leaf', 'prefix')
+
+    def __init__(self):
+        # literal segment -> _Node
+        self.children = {}
+        # _Node of a {name} segment
+        self.param = None
+        # (plan, names) of route ending here
+        self.leaf = None
+        # (plan, names) of prefix route ending here
+        self.prefix = None
+
+
+class RouteIndex(dict):
+    """Route plans indexed by request URL of config
+
+    Dict of exact URL, match() also find pattern routes.
+    """
+
+    def __init__(self, plans=()):
+        """
+        Args:
+            plans: dict or list of (request URL, plan)
+        """
+        dict.__init__(self, plans)
+        self._root = _Node()
+        regex = []
+        for url in sorted(self.keys()):
+            kind = route_kind(url)
+            if kind == 'segment':
+                self._add_segments(url, self[url])
+            elif kind == 'regex':
+                regex.append((url, re.compile(url), self[url]))
+        self._regex = tuple(regex)
+        # split in chunks of less than MAX_GROUPS groups (a route group
+        # and groups of route regex)
+        combined = []
+        chunk = []
+        groups = 0
+        for (i, (url, pattern, plan)) in enumerate(regex):
+            if chunk and groups + pattern.groups + 1 > MAX_GROUPS:
+                combined.append(_combine(chunk))
+                chunk = []
+                groups = 0
+            chunk.append((i, url))
+            groups += pattern.groups + 1
+        if chunk:
+            combined.append(_combine(chunk))
+        self._combined = tuple(combined)
+
+    def _add_segments(self, url, plan):
+        segments = url.strip('/').split('/')
+        prefix = segments[-1] == '*'
+        if prefix:
+            segments.pop()
+        names = []
+        node = self._root
+        for segment in segments:
+            if segment.startswith('{') and segment.endswith('}'):
+                names.append(segment[1:-1])
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            elif '{' in segment:
+                raise ValueError("placeholder must be a whole segment in %r"
+                                 % url)
+            else:
+                node = node.children.setdefault(segment, _Node())
+        if prefix:
+            node.prefix = (plan, tuple(names))
+        else:
+            node.leaf = (plan, tuple(names))
+
+    def match(self, path):
+        """Find route of request path
+
+        Returns:
+            (plan, captures dict), or (None, None) if no route
+        """
+        plan = self.get(path)
+        if plan is not None and route_kind(path) == 'exact':
+            return (plan, {})
+        segments = path.strip('/').split('/')
+        found = _match_node(self._root, segments, 0, [])
+        if found is not None:
+            return found
+        for combined in self._combined:
+            match = combined.match(path)
+            if match is not None:
+                # route group is closed last
+                (url, pattern, plan) = self._regex[int(match.lastgroup[2:])]
+                return (plan, pattern.match(path).groupdict())
+        return (None, None)
+
+
+def _combine(regex):
+    """One regex of list of (index, regex URL), group _r<index> match"""
+    # user groups are not captured in combined regex : same name can be
+    # used by different routes
+    return re.compile('|'.join(['(?P<_r%d>%s)' %
+                                (i, _NAMED_GROUP.sub('(?:', url))
+                                for (i, url) in regex]))
+
+
+def _match_node(node, segments, position, values):
+    """Walk trie: literal segment first, then {name}, then prefix"""
+    if position == len(segments):
+        if node.leaf is not None:
+            (plan, names) = node.leaf
+            return (plan, dict(zip(names, values)))
+    else:
+        segment = segments[position]
+        child = node.children.get(segment)
+        if child is not None:
+            found = _match_node(child, segments, position + 1, values)
+            if found is not None:
+                return found
+        if node.param is not None and segment:
+            found = _match_node(node.param, segments, position + 1,
+                                values + [segment])
+            if found is not None:
+                return found
+    if node.prefix is not None:
+        (plan, names) = node.prefix
+        captures = dict(zip(names, values))
+        captures[PREFIX_CAPTURE] = '/'.join(segments[position:])
+        return (plan, captures)
+    return None
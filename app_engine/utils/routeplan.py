@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+routeplan.py
+
+Compile config of a request URL (route) into flat plan objects, once
+at config load : default values are merged, lists turned in frozensets,
+headers, URL templates, pools... built. Handling a request then only
+read attributes.
+"""
+
+import hashlib
+
+from Chainmap import Chainmap
+from urlforward import build_headers
+from urltemplate import UrlTemplate
+from pool import Pool
+from failover import Failover, FAILOVER_STATUS, RETRY_DELAY
+from idempotency import Idempotency, IDEMPOTENCY_TTL
+from responsecache import ResponseCache, CACHE_MAX_ITEMS
+from admission import PRIORITIES
+from routeindex import RouteIndex
+from canary import Canary
+from interpolation import interpolator, mask
+
+# route keys of idempotency (outcomes are kept by reload if unchanged)
+IDEMPOTENCY_KEYS = ('idempotency_key', 'idempotency_store', 'idempotency_ttl')
+
+# forward keys of destination : a forward stored for later (task, dead
+# letter) is only sent with config of a forward with same fingerprint
+FINGERPRINT_KEYS = ('url', 'pool', 'fallbacks', 'method')
+
+
+class RoutePlan(object):
+    """Compiled config of a request URL"""
+
+    __slots__ = ('url',
+                 'methods',
+                 'remote_addr',
+                 'forwards',
+                 'idempotency',
+                 'priority',
+                 'max_inflight',
+                 'deadline_header',
+                 'canary',
+                 'source')
+
+
+class ForwardPlan(object):
+    """Compiled config of a forward"""
+
+    __slots__ = ('index',
+                 'url',
+                 'url_template',
+                 'pool',
+                 'failover',
+                 'method',
+                 'fetch_param',
+                 'remove',
+                 'only',
+                 'default',
+                 'set',
+                 'shadow',
+                 'shadow_percent',
+                 'delay',
+                 'batch_every',
+                 'order_by',
+                 'deadline_min',
+                 'dead_letter',
+                 'fingerprint',
+                 'source')
+
+    def __repr__(self):
+        return "ForwardPlan(%r)" % self.url
+
+
+def compile_routes(options, config_default, previous=None):
+    """Compile all routes
+
+    Args:
+        options: dict of route config indexed by URL (from yaml files)
+        config_default: default route config ('::dummy::' item)
+        previous: routes compiled before (mapping by URL), unchanged
+            routes and forwards are kept with their state (pools,
+            caches...)
+
+    Returns:
+        a RouteIndex of RoutePlan
+    """
+    if previous is None:
+        previous = {}
+    interpolator.begin()
+    routes = RouteIndex([(url_request,
+                          compile_route(config_request, config_default,
+                                        previous.get(url_request)))
+                         for (url_request, config_request) in options.items()])
+    # secret files no more referenced are no more watched
+    interpolator.end()
+    return routes
+
+
+def compile_route(config_request, config_default, previous=None):
+    """Compile a route
+
+    Args:
+        config_request: route item from yaml file
+        config_default: default route config, its first forward is
+            default forward config
+        previous: RoutePlan compiled before for same URL, or None
+
+    Returns:
+        a RoutePlan (previous if config did not change)
+    """
+    # ${...} references resolved (secrets are never in source files),
+    # and masked in shown forward URLs
+    flat = flatten_route(config_request, config_default)
+    config = interpolator.resolve(flat)
+    if previous is not None and previous.source == config:
+        return previous
+    shown_forwards = route_forwards(mask(flat))
+
+    plan = RoutePlan()
+    plan.source = config
+    plan.url = config['url']
+    plan.methods = frozenset(config['methods'])
+    plan.remote_addr = _frozenset(config.get('remote_addr'))
+    plan.priority = config.get('priority', 'normal')
+    if plan.priority not in PRIORITIES:
+        raise ValueError("unknown priority %r for %s" %
+                         (plan.priority, plan.url))
+    plan.max_inflight = config.get('max_inflight')
+    plan.deadline_header = config.get('deadline_header')
+    plan.idempotency = None
+    if config.get('idempotency_key'):
+        if previous is not None and previous.idempotency is not None and \
+           _same(previous.source, config, IDEMPOTENCY_KEYS):
+            # keep recorded outcomes
+            plan.idempotency = previous.idempotency
+        else:
+            plan.idempotency = Idempotency(
+                config['idempotency_key'],
+                config.get('idempotency_store') or 'local',
+                config.get('idempotency_ttl') or IDEMPOTENCY_TTL,
+                plan.url)
+
+    # forwards of all versions, index is position in this tuple
+    forwards = []
+    for (index, config_forward) in enumerate(route_forwards(config)):
+        if previous is not None and index < len(previous.forwards) and \
+           previous.forwards[index].source == config_forward:
+            forwards.append(previous.forwards[index])
+        else:
+            forwards.append(compile_forward(index, config_forward,
+                                            shown_forwards[index]))
+    plan.forwards = tuple(forwards)
+    plan.canary = None
+    if config.get('versions'):
+        versions = []
+        start = 0
+        for version in config['versions']:
+            end = start + len(version['forwards'])
+            versions.append((version['name'], version.get('weight', 0),
+                             plan.forwards[start:end]))
+            start = end
+        plan.canary = Canary(config.get('canary_key'), versions)
+    return plan
+
+
+def route_forwards(config_request):
+    """Forward items of a route, or of all its versions (in order)"""
+    if not config_request.get('versions'):
+        return config_request['forwards']
+    forwards = []
+    for version in config_request['versions']:
+        forwards.extend(version['forwards'])
+    return forwards
+
+
+def flatten_route(config_request, config_default):
+    """Route config with default values merged (as plain dicts)"""
+    config_forward_default = config_default.get('forwards', [{}])[0]
+    flat = dict(Chainmap(config_request, config_default))
+    if config_request.get('versions'):
+        flat['versions'] = [
+            dict(version, forwards=[
+                dict(Chainmap(config_forward, config_forward_default))
+                for config_forward in version['forwards']])
+            for version in config_request['versions']]
+        flat.pop('forwards', None)
+    else:
+        flat['forwards'] = [
+            dict(Chainmap(config_forward, config_forward_default))
+            for config_forward in config_request['forwards']]
+    return flat
+
+
+def compile_forward(index, config, shown=None):
+    """Compile a forward
+
+    Args:
+        index: index of forward in route
+        config: forward item (with default values)
+        shown: forward item with secrets masked, its URLs are shown in
+            responses and logs (default to config)
+
+    Returns:
+        a ForwardPlan
+    """
+    if shown is None:
+        shown = config
+    plan = ForwardPlan()
+    plan.source = config
+    plan.index = index
+    plan.url = config.get('url')
+    plan.method = config['method']
+
+    # destination
+    plan.pool = None
+    plan.url_template = None
+    if config.get('pool'):
+        plan.pool = Pool(config['pool'],
+                         config.get('balance', 'round_robin'),
+                         config.get('balance_key'),
+                         shown['pool'])
+    else:
+        plan.url_template = UrlTemplate(config['url'], shown['url'])
+    plan.failover = None
+    if config.get('fallbacks'):
+        plan.failover = Failover(
+            config['fallbacks'],
+            config.get('failover_status') or FAILOVER_STATUS,
+            config.get('failover_delay') or RETRY_DELAY,
+            shown['fallbacks'])
+
+    # urlforward arguments
+    # (HTTP Basic authentication is precomputed in headers)
+    plan.fetch_param = {'method': plan.method,
+                        'headers': build_headers(config.get('headers'),
+                                                 config.get('login'),
+                                                 config.get('password')),
+                        'follow_redirects': config.get('follow_redirects',
+                                                       True)}
+    if config.get('cache_ttl') and plan.method == 'GET':
+        plan.fetch_param['cache'] = ResponseCache(
+            config['cache_ttl'],
+            config.get('cache_max_items') or CACHE_MAX_ITEMS)
+
+    # parameters
+    plan.remove = frozenset(config.get('remove') or ())
+    plan.only = _frozenset(config.get('only'))
+    plan.default = dict(config.get('default') or {})
+    plan.set = dict(config.get('set') or {})
+
+    # delivery
+    plan.shadow = bool(config.get('shadow'))
+    plan.shadow_percent = config.get('shadow_percent', 100)
+    plan.delay = config.get('delay') or 0
+    plan.batch_every = config.get('batch_every')
+    plan.order_by = config.get('order_by')
+    plan.deadline_min = config.get('deadline_min', 0)
+    plan.dead_letter = bool(config.get('dead_letter'))
+    plan.fingerprint = forward_fingerprint(config)
+    return plan
+
+
+def forward_fingerprint(config):
+    """Hash of destination of a forward config (see FINGERPRINT_KEYS)"""
+    return hashlib.md5(repr(_canonical(
+        [(key, config.get(key)) for key in FINGERPRINT_KEYS]))).hexdigest()
+
+
+def _canonical(value):
+    """value with mappings as sorted lists and text as utf-8, so its
+    repr only depend on content
+    """
+    if isinstance(value, dict):
+        return sorted([(_canonical(key), _canonical(item))
+                       for (key, item) in value.items()])
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _same(config, other, keys):
+    """True if both configs have same values for keys"""
+    for key in keys:
+        if config.get(key) != other.get(key):
+            return False
+    return True
+
+
+def _frozenset(items):
+    """frozenset of items, None if not set"""
+    if items is None:
+        return None
+    return frozenset(items)
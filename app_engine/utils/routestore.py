@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+routestore.py
+
+Routes stored in datastore, so they can be added at runtime (ex: with
+remote_api) without deploy nor reloading all routes.
+
+A route is read from datastore at its first request, compiled, and kept
+in a per-instance LRU cache. Each change increment a version counter
+(in memcache, backed by datastore), checked at most every
+VERSION_INTERVAL seconds : when changed, cached routes are dropped.
+
+Routes of config files (YamlOptions) are looked up first.
+"""
+
+import threading
+import time
+
+import yaml
+from google.appengine.ext import db
+from google.appengine.api import memcache
+
+from lrucache import LRUCache
+from routeindex import RouteIndex, route_kind
+from routeplan import compile_route
+
+# compiled routes kept in memory
+ROUTE_CACHE_ITEMS = 10000
+
+# unknown URLs kept in memory (not read again until version change)
+MISSING_CACHE_ITEMS = 10000
+
+# seconds between checks of version counter
+VERSION_INTERVAL = 10
+
+VERSION_KEY = 'routestore.version'
+
+# seconds a changed version can't be cached again in memcache (by a
+# reader who got it from datastore before the change)
+VERSION_LOCK = 5
+
+
+class Route(db.Model):
+    """A route config, key name is request URL"""
+    item = db.TextProperty(required=True) # yaml of route config
+    exact = db.BooleanProperty(required=True)
+    updated = db.DateTimeProperty(auto_now=True)
+
+
+class RouteVersion(db.Model):
+    """Version counter of routes (single entity)"""
+    version = db.IntegerProperty(default=0)
+
+
+def put_route(config_request, config_default):
+    """Store a route config (replace route with same URL)
+
+    Raises:
+        error of compile_route if config is invalid
+    """
+    compile_route(config_request, config_default)
+    url = config_request['url']
+    Route(key_name=url, item=yaml.safe_dump(config_request),
+          exact=route_kind(url) == 'exact').put()
+    _increment_version()
+
+
+def delete_route(url):
+    """Remove a stored route"""
+    db.delete(db.Key.from_path('Route', url))
+    _increment_version()
+
+
+def _increment_version():
+    def txn():
+        counter = RouteVersion.get_by_key_name('version')
+        if counter is None:
+            counter = RouteVersion(key_name='version')
+        counter.version += 1
+        counter.put()
+        return counter.version
+    db.run_in_transaction(txn)
+    # not set : a concurrent change could set an older version after
+    # this one, readers get it again from datastore
+    memcache.delete(VERSION_KEY, VERSION_LOCK)
+
+
+class RouteStore(object):
+    """Compiled routes of config files, then of datastore
+
+    Usage like YamlOptions : route in store, store[route],
+    store.match(path)
+    """
+
+    def __init__(self, config_default, base=None,
+                 max_items=ROUTE_CACHE_ITEMS,
+                 version_interval=VERSION_INTERVAL):
+        """
+        Args:
+            config_default: default route config ('::dummy::' item)
+            base: routes looked up first (YamlOptions), or None
+            max_items: max routes kept in memory
+            version_interval: seconds between version checks
+        """
+        self.base = base
+        self._config_default = config_default
+        self._max_items = max_items
+        self.version_interval = version_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = None
+        self._reset(None)
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __getitem__(self, url):
+        plan = self.get(url)
+        if plan is None:
+            raise KeyError(url)
+        return plan
+
+    def get(self, url, default=None, now=None):
+        """Return RoutePlan of config URL, default if not found"""
+        if self.base is not None and url in self.base:
+            return self.base[url]
+        self.check_version(now)
+        if route_kind(url) != 'exact':
+            return self._patterns.get(url, default)
+        plan = self._cache.get(url)
+        if plan is not None:
+            return plan
+        if url in self._missing:
+            return default
+        config_request = self._fetch(url)
+        if config_request is None:
+            self._missing.set(url, True)
+            return default
+        plan = compile_route(config_request, self._config_default)
+        self._cache.set(url, plan)
+        return plan
+
+    def match(self, path, now=None):
+        """Find route of request path, see RouteIndex.match"""
+        if self.base is not None:
+            (plan, captures) = self.base.match(path)
+            if plan is not None:
+                return (plan, captures)
+        if route_kind(path) == 'exact':
+            plan = self.get(path, now=now)
+            if plan is not None:
+                return (plan, {})
+        else:
+            self.check_version(now)
+        return self._patterns.match(path)
+
+    def reload(self):
+        """Reload config files, stored routes are read on demand
+
+        Returns:
+            True if config files changed
+        """
+        if self.base is None:
+            return False
+        return self.base.reload()
+
+    def paths(self):
+        if self.base is None:
+            return []
+        return self.base.paths()
+
+    def stats(self):
+        return self._cache.stats()
+
+    def check_version(self, now=None):
+        """Drop cached routes if version changed (checked every
+        version_interval seconds)"""
+        if now is None:
+            now = time.time()
+        if self._checked is not None and \
+           now - self._checked < self.version_interval:
+            return
+        self._lock.acquire()
+        try:
+            if self._checked is not None and \
+               now - self._checked < self.version_interval:
+                return
+            self._checked = now
+            version = self._fetch_version()
+            if version != self._version:
+                self._reset(version)
+        finally:
+            self._lock.release()
+
+    def _reset(self, version):
+        """Drop cached routes, load pattern routes"""
+        self._cache = LRUCache(self._max_items)
+        self._missing = LRUCache(MISSING_CACHE_ITEMS)
+        if version is None:
+            self._patterns = RouteIndex()
+        else:
+            # pattern routes can't be found by key : all loaded
+            self._patterns = RouteIndex([
+                (config_request['url'],
+                 compile_route(config_request, self._config_default))
+                for config_request in self._fetch_patterns()])
+        self._version = version
+
+    # ===================
+    # = Datastore reads =
+    # ===================
+
+    def _fetch(self, url):
+        """Route config of URL, None if not stored"""
+        route = Route.get_by_key_name(url)
+        if route is None:
+            return None
+        return yaml.safe_load(route.item)
+
+    def _fetch_patterns(self):
+        """Route configs of pattern URLs"""
+        return [yaml.safe_load(route.item)
+                for route in Route.all().filter('exact =', False)]
+
+    def _fetch_version(self):
+        version = memcache.get(VERSION_KEY)
+        if version is None:
+            counter = RouteVersion.get_by_key_name('version')
+            version = counter and counter.version or 0
+            memcache.add(VERSION_KEY, version)
+        return version
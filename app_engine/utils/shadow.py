@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+shadow.py
+
+Shadow forwards : mirror a sample of traffic to a destination,
+without changing response of original request.
+
+Shadow requests are queued in App Engine task queue and sent by
+tasks.py : original request only wait for the task to be added, never
+for shadow destination. Shadow tasks are never retried, their result
+only go to metrics (of process running the task).
+"""
+
+import random
+
+try:
+    from google.appengine.api import taskqueue
+except ImportError:
+    from google.appengine.api.labs import taskqueue
+
+import metrics
+from urlforward import encode_param
+
+# URL of task handler (see tasks.py)
+TASK_URL = '/_tasks/shadow'
+
+# queue for shadow forwards, without retry (see queue.yaml)
+QUEUE_NAME = 'shadow'
+
+
+def sample(percent):
+    """True for percent % of calls"""
+    return percent >= 100 or random.random() * 100 < percent
+
+
+def defer(route, forward, fingerprint, name, url, param):
+    """Queue a shadow forward
+
+    Args:
+        route: request URL from config
+        forward: index of forward in route config
+            (headers, credentials and 'set' parameters are taken from
+            config when sent)
+        fingerprint: fingerprint of forward config (dropped when sent
+            if forward changed)
+        name: destination name used in metrics (URL template)
+        url: destination URL (template filled)
+        param: forwarded parameters mapping, without 'set' ones
+    """
+    taskqueue.Task(url=TASK_URL,
+                   params={'route': route,
+                           'forward': str(forward),
+                           'fingerprint': fingerprint,
+                           'name': name,
+                           'url': url,
+                           'payload': encode_param(param)}).add(QUEUE_NAME)
+
+
+def record(name, status_code, latency):
+    """Record result of a shadow forward sent"""
+    metrics.incr('shadow.sent')
+    metrics.incr('shadow.status.%s' % (status_code or 'error'))
+    metrics.timing('shadow.%s' % name, latency)
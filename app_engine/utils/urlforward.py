@@ -14,14 +14,53 @@ import base64
 
 from google.appengine.api import urlfetch
 
+# raised by urlforward on connection error or timeout
+FetchError = urlfetch.Error
+
+
+def encode_param(param):
+    """urlencode param mapping, unicode values are sent as utf-8"""
+    return urllib.urlencode(dict([
+        (key, _utf8(value)) for (key, value) in param.items()]))
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def build_headers(headers=None, login=None, password=None):
+    """Build static HTTP headers of a forward
+
+    Called once when config is loaded, result is shared by every
+    forwarded request (and never mutated).
+
+    Args:
+        headers: mapping of HTTP headers {'name': "value"}
+        login: name used for HTTP Basic authentication
+        password: password used for HTTP Basic authentication
+            both login and password must be set
+
+    Returns:
+        a tuple of (name, value) HTTP headers
+    """
+    items = dict(headers or {})
+    if login and password:
+        items['Authorization'] = 'Basic ' + \
+            base64.b64encode('%s:%s' % (login, password))
+    return tuple(sorted(items.items()))
+
 
 def urlforward(url=None,
                param={},
                method="GET",
-               headers={},
+               headers=(),
                follow_redirects=True,
                login=None,
-               password=None):
+               password=None,
+               cache=None,
+               deadline=None):
     """Warper around urlfetch.fetch :
      - Add HTTP Basic authentication
          both login and password must be set
@@ -33,29 +72,50 @@ def urlforward(url=None,
         url: http or https URL
         param:
         method: HTTP method "GET" by default
-        headers: mapping of HTTP headers {'name': "value"}
+        headers: mapping or (name, value) tuple of HTTP headers,
+            see build_headers
         follow_redirects: Allow follow of HTTP redirect, default to True
         login: name used for HTTP Basic authentication
         password: password used for HTTP Basic authentication
+        cache: ResponseCache used for GET request
+        deadline: max seconds to wait for response
 
     Returns:
      status_code of forwarded request
     """
+    fetch_param = _fetch_param(url, param, method, headers,
+                               follow_redirects, login, password)
+    if deadline is not None:
+        fetch_param['deadline'] = deadline
+
+    if cache is not None and method == 'GET':
+        return cache.fetch(fetch_param, urlfetch.fetch)
+
+    # TODO: need to return more than status code ?
+    result = urlfetch.fetch(**fetch_param)
+    return result.status_code
+
+
+def _fetch_param(url, param, method, headers, follow_redirects,
+                 login=None, password=None):
+    """Build urlfetch arguments"""
     fetch_param = {'url': url,
                    'method': method,
-                   'headers': headers,
+                   'headers': dict(headers),
                    'follow_redirects': follow_redirects}
     if param:
-        payload = urllib.urlencode(param)
+        payload = encode_param(param)
         if method in ['POST', 'PUT']:
             fetch_param['payload'] = payload
         else:
-            fetch_param['url'] = url + '?' + payload
+            if '?' in url:
+                fetch_param['url'] = url + '&' + payload
+            else:
+                fetch_param['url'] = url + '?' + payload
 
     if login and password:
-        fetch_param['headers']['Authorization'] = 'Basic ' + \
-            base64.encodestring('%s:%s' % (login, password))
+        # not precomputed by build_headers : done at each call
+        fetch_param['headers'].update(build_headers(login=login,
+                                                    password=password))
 
-    # TODO: need to return more than status code ?
-    result = urlfetch.fetch(**fetch_param)
-    return result.status_code
+    return fetch_param
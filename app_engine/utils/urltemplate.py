@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+urltemplate.py
+
+Forward URL with {name} placeholders, like :
+    https://www.some.tld/{tenant}/hooks
+
+A template can be shown (responses, logs, metrics) from another one,
+with secrets masked (see interpolation.mask).
+"""
+
+import urllib
+
+
+class UrlTemplate(object):
+    """URL template compiled once (at config load)
+
+    Placeholder values are taken from mappings given to expand,
+    and escaped (so a value can't add path segment or parameter).
+    """
+
+    def __init__(self, template, shown=None):
+        """
+        Args:
+            template: URL with optional {name} placeholders
+            shown: template shown instead of template (same
+                placeholders), default to template
+        """
+        if shown is None:
+            shown = template
+        self.template = template
+        self.shown = shown
+        self._parts = _parse(template, shown)
+        self._shown_parts = self._parts
+        if shown != template:
+            self._shown_parts = _parse(shown, shown)
+        self.names = tuple(self._parts[1::2])
+
+    def expand(self, *maps):
+        """Fill placeholders
+
+        Args:
+            maps: mappings looked up in sequence for each placeholder
+
+        Returns:
+            URL string
+
+        Raises:
+            KeyError: if a placeholder is not found in any mapping
+        """
+        return _fill(self._parts, maps)
+
+    def expand_shown(self, *maps):
+        """Fill placeholders of shown template (see expand)"""
+        return _fill(self._shown_parts, maps)
+
+    def __str__(self):
+        return self.shown
+
+    def __repr__(self):
+        return "UrlTemplate(%r)" % self.shown
+
+
+def _parse(template, shown):
+    """Split template in alternate literal text and placeholder name,
+    always starting and ending by a literal text (errors show shown)
+    """
+    parts = []
+    rest = template
+    while '{' in rest:
+        (literal, rest) = rest.split('{', 1)
+        if '}' not in rest:
+            raise ValueError("unclosed placeholder in %r" % shown)
+        (name, rest) = rest.split('}', 1)
+        if not name:
+            raise ValueError("empty placeholder in %r" % shown)
+        parts.append(literal)
+        parts.append(name)
+    parts.append(rest)
+    return tuple(parts)
+
+
+def _fill(parts, maps):
+    """Join parts with placeholders filled from maps"""
+    if len(parts) == 1:
+        return parts[0]
+    parts = list(parts)
+    for i in xrange(1, len(parts), 2):
+        parts[i] = urllib.quote(_lookup(parts[i], maps), safe='')
+    return ''.join(parts)
+
+
+def _lookup(name, maps):
+    """Return first value found for name as an utf-8 string"""
+    for mapping in maps:
+        if name in mapping:
+            value = mapping[name]
+            if isinstance(value, unicode):
+                return value.encode('utf-8')
+            return str(value)
+    raise KeyError(name)
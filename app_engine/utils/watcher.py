@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+watcher.py
+
+Reload config in a background thread when config files change, so
+production instance take new routes without redeploy.
+
+Files are watched with inotify (pyinotify) on Linux, else polled. New
+routes are compiled out of request path and swapped in one assignment
+(see YamlOptions.reload), an invalid config is logged and ignored.
+
+Only started with real threads and config files to watch : without
+'thread' module (ex: 'runtime: python' of app-sample.yaml, where
+deployed files never change) threading is dummy_threading, whose
+Thread.start() would run the watcher in place, never returning.
+"""
+
+import logging
+import os
+import threading
+
+try:
+    import thread
+except ImportError:
+    thread = None
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# seconds between polls of config files
+POLL_INTERVAL = 5.0
+
+
+class Watcher(threading.Thread):
+    """Thread reloading a YamlOptions"""
+
+    def __init__(self, config, interval=POLL_INTERVAL):
+        threading.Thread.__init__(self, name='config-watcher')
+        self.setDaemon(True)
+        self.config = config
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        """Reload config if changed, return True if reloaded"""
+        try:
+            return self.config.reload()
+        except Exception, e:
+            logging.error("invalid config not loaded: %s", e)
+            return False
+
+    def run(self):
+        if pyinotify is not None:
+            self._run_inotify()
+        else:
+            self._run_poll()
+
+    def _run_poll(self):
+        while not self._stopped.isSet():
+            self._stopped.wait(self.interval)
+            if not self._stopped.isSet():
+                self.check()
+
+    def _run_inotify(self):
+        paths = self.config.paths()
+        manager = pyinotify.WatchManager()
+        # watch directories : editors replace files
+        for directory in set([os.path.dirname(path) for path in paths]):
+            manager.add_watch(directory, pyinotify.IN_CLOSE_WRITE |
+                                         pyinotify.IN_MOVED_TO |
+                                         pyinotify.IN_DELETE)
+        notifier = pyinotify.Notifier(manager,
+                                      timeout=int(self.interval * 1000))
+        try:
+            while not self._stopped.isSet():
+                if notifier.check_events():
+                    notifier.read_events()
+                    notifier.process_events()
+                # stat is cheap, files not changed are not parsed
+                self.check()
+        finally:
+            notifier.stop()
+
+
+def start(config, interval=POLL_INTERVAL):
+    """Start a Watcher of config, None if hot reload is not available
+    (no real threads, or no config files)
+    """
+    if thread is None:
+        logging.info("config hot reload unavailable: no threads")
+        return None
+    if not config.paths():
+        logging.info("config hot reload unavailable: no config files")
+        return None
+    watcher = Watcher(config, interval)
+    try:
+        watcher.start()
+    except Exception, e:
+        logging.warning("config watcher not started: %s", e)
+        return None
+    return watcher
@@ -9,8 +9,19 @@ Copyright (c) 2009 __pierreTM__. All rights reserved.
 
 import os
 import UserDict
+import hashlib
+import logging
+import cPickle as pickle
 import yaml
 
+# libyaml parser if available (much faster)
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from routeplan import compile_routes
+from interpolation import interpolator
 from Chainmap import Chainmap
 
 # ====================
@@ -27,7 +38,20 @@ def get_config_from(config_file, base_dir):
     Returns:
         a dict of config item indexed by URL
     """
-    options_list = yaml.safe_load(file(os.path.join(base_dir, config_file)))
+    config = open(os.path.join(base_dir, config_file))
+    try:
+        return parse_config(config.read())
+    finally:
+        config.close()
+
+
+def parse_config(content):
+    """Parse yaml content
+
+    Returns:
+        a dict of config item indexed by URL
+    """
+    options_list = yaml.load(content, Loader=SafeLoader)
     options_dict = {}
     # organise configuration by requested url
     for item in options_list:
@@ -35,38 +59,349 @@ def get_config_from(config_file, base_dir):
     return options_dict
 
 
+# ===================
+# = Parsed snapshot =
+# ===================
+
+def snapshot_prefix(name):
+    """Start of snapshot file names of a config file"""
+    return '%s-' % hashlib.md5(name).hexdigest()[:12]
+
+
+def snapshot_path(cache_dir, name, digest):
+    """Path of parsed snapshot of a config file content hash"""
+    return os.path.join(cache_dir,
+                        '%s%s.pickle' % (snapshot_prefix(name), digest))
+
+
+def load_snapshot(cache_dir, name, digest):
+    """Return parsed options of content hash, None if not in cache"""
+    try:
+        snapshot = open(snapshot_path(cache_dir, name, digest), 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            return pickle.load(snapshot)
+        except Exception, e:
+            logging.warning("config snapshot %s ignored: %s", digest, e)
+            return None
+    finally:
+        snapshot.close()
+
+
+def save_snapshot(cache_dir, name, digest, options):
+    """Write parsed options of content hash (ignored if read only),
+    previous snapshots of config file are removed
+    """
+    path = snapshot_path(cache_dir, name, digest)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # write then rename : a reader never see a partial file
+        snapshot = open(path + '.tmp', 'wb')
+        try:
+            pickle.dump(options, snapshot, pickle.HIGHEST_PROTOCOL)
+        finally:
+            snapshot.close()
+        os.rename(path + '.tmp', path)
+        prune_snapshots(cache_dir, name, digest)
+    except (IOError, OSError), e:
+        logging.debug("config snapshot %s not saved: %s", digest, e)
+
+
+def prune_snapshots(cache_dir, name, digest):
+    """Remove snapshots of config file other than content hash"""
+    prefix = snapshot_prefix(name)
+    keep = os.path.basename(snapshot_path(cache_dir, name, digest))
+    for snapshot in os.listdir(cache_dir):
+        if snapshot.startswith(prefix) and snapshot.endswith('.pickle') \
+           and snapshot != keep:
+            os.remove(os.path.join(cache_dir, snapshot))
+
+
+# ==============
+# = ConfigFile =
+# ==============
+
+class ConfigFile(object):
+    """A yaml file, parsed again only when changed
+
+    File is stat at each check, read when mtime or size change, and
+    parsed only if content hash changed (ex: touched file).
+    With a cache_dir, parsed options are read from a snapshot of same
+    content hash if any, and saved after parsing (replacing snapshot of
+    previous content).
+    """
+
+    def __init__(self, config_file, base_dir, cache_dir=None):
+        self.name = config_file
+        self.path = os.path.join(base_dir, config_file)
+        self.cache_dir = cache_dir
+        self.stat = None
+        self.digest = None
+        self.options = None
+
+    def check(self):
+        """Return True if parsed options changed since last check"""
+        st = os.stat(self.path)
+        stat = (st.st_mtime, st.st_size)
+        if stat == self.stat:
+            return False
+        config = open(self.path)
+        try:
+            content = config.read()
+        finally:
+            config.close()
+        self.stat = stat
+        digest = hashlib.md5(content).hexdigest()
+        if digest == self.digest:
+            return False
+        self.options = self.parse(content, digest)
+        self.digest = digest
+        return True
+
+    def parse(self, content, digest):
+        """Parsed options of content, from snapshot if any"""
+        if not self.cache_dir:
+            return parse_config(content)
+        options = load_snapshot(self.cache_dir, self.name, digest)
+        if options is None:
+            options = parse_config(content)
+            save_snapshot(self.cache_dir, self.name, digest, options)
+        return options
+
+
+# ================
+# = ConfigLayers =
+# ================
+
+# per directory defaults ('::dummy::' item), for routes of directory and
+# its sub directories
+DEFAULTS_FILE = '_defaults.yaml'
+
+# item holding default values of routes
+DEFAULT_URL = '::dummy::'
+
+# item holding forward templates, used in a forward by 'template: name'
+TEMPLATES_URL = '::templates::'
+
+
+class ConfigLayers(object):
+    """Route items of config files and include directories, with
+    layers of default values merged once at load
+
+    Entry of yaml_list can be a directory : its yaml files (sorted) and
+    sub directories are loaded, a _defaults.yaml file in a directory
+    give default values for its routes (over parent directory ones,
+    over yaml_default).
+
+    A forward can use a template (defined in '::templates::' item of
+    any file) : forward values, then template, then defaults.
+    """
+
+    def __init__(self, yaml_list, yaml_default, base_dir, cache_dir=None):
+        self._yaml_list = yaml_list
+        self._yaml_default = yaml_default
+        self._base_dir = base_dir
+        self._cache_dir = cache_dir
+        # name (relative to base_dir) -> ConfigFile
+        self._config_files = {}
+        self._layout = None
+        self.options = None
+        self.config_default = None
+
+    def layout(self):
+        """List of (route file, its defaults files innermost first),
+        first file override others"""
+        layout = []
+        for entry in self._yaml_list:
+            if os.path.isdir(os.path.join(self._base_dir, entry)):
+                layout.extend(self._scan(entry, ()))
+            else:
+                layout.append((entry, ()))
+        return layout
+
+    def _scan(self, directory, defaults):
+        names = sorted(os.listdir(os.path.join(self._base_dir, directory)))
+        if DEFAULTS_FILE in names:
+            defaults = (os.path.join(directory, DEFAULTS_FILE), ) + defaults
+        layout = []
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isdir(os.path.join(self._base_dir, path)):
+                layout.extend(self._scan(path, defaults))
+            elif name.endswith('.yaml') and name != DEFAULTS_FILE:
+                layout.append((path, defaults))
+        return layout
+
+    def files(self, layout=None):
+        """All config files (relative to base_dir), lowest layer first"""
+        if layout is None:
+            layout = self.layout()
+        names = [self._yaml_default]
+        for (config_file, defaults) in layout:
+            for name in reversed(defaults):
+                if name not in names:
+                    names.append(name)
+        for (config_file, defaults) in reversed(layout):
+            if config_file not in names:
+                names.append(config_file)
+        return names
+
+    def paths(self):
+        """Paths of config files"""
+        return [os.path.join(self._base_dir, name) for name in self.files()]
+
+    def check(self):
+        """Load config files changed since last check
+
+        Returns:
+            True if options changed
+        """
+        layout = self.layout()
+        names = self.files(layout)
+        changed = layout != self._layout
+        config_files = {}
+        for name in names:
+            config_file = self._config_files.get(name)
+            if config_file is None:
+                config_file = ConfigFile(name, self._base_dir,
+                                         self._cache_dir)
+            changed = config_file.check() or changed
+            config_files[name] = config_file
+        self._config_files = config_files
+        self._layout = layout
+        if not changed:
+            return False
+
+        # templates of first file override others
+        templates = {}
+        for name in names:
+            item = config_files[name].options.get(TEMPLATES_URL)
+            if item:
+                templates.update(item.get('templates') or {})
+
+        options = {}
+        for (config_file, defaults) in reversed(layout):
+            layers = [config_files[name].options.get(DEFAULT_URL) or {}
+                      for name in defaults]
+            for (url, item) in config_files[config_file].options.items():
+                if not url.startswith('::'):
+                    options[url] = apply_layers(item, layers, templates)
+        self.options = options
+        self.config_default = \
+            config_files[self._yaml_default].options[DEFAULT_URL]
+        return True
+
+    def reset(self):
+        """Forget loaded files : all are parsed again at next check"""
+        for config_file in self._config_files.values():
+            config_file.stat = config_file.digest = None
+        self._layout = None
+
+
+def apply_layers(item, layers, templates):
+    """Route item with templates and default layers merged
+
+    Args:
+        item: route item of a config file
+        layers: '::dummy::' items, innermost first
+        templates: forward templates by name
+
+    Raises:
+        ValueError: if a forward use an unknown template
+    """
+    route_layers = [dict([(key, value) for (key, value) in layer.items()
+                          if key not in ('url', 'forwards', 'versions')])
+                    for layer in layers]
+    forward_layers = [layer['forwards'][0] for layer in layers
+                      if layer.get('forwards')]
+
+    def forward(config_forward):
+        maps = [config_forward]
+        name = config_forward.get('template')
+        if name is not None:
+            if name not in templates:
+                raise ValueError("unknown forward template %s in %s" %
+                                 (name, item.get('url')))
+            maps.append(templates[name])
+        merged = dict(Chainmap(*(maps + forward_layers)))
+        merged.pop('template', None)
+        return merged
+
+    route = dict(Chainmap(item, *route_layers))
+    if item.get('versions'):
+        route['versions'] = [dict(version, forwards=[
+                                 forward(config_forward)
+                                 for config_forward in version['forwards']])
+                             for version in item['versions']]
+    elif item.get('forwards'):
+        route['forwards'] = [forward(config_forward)
+                             for config_forward in item['forwards']]
+    return route
+
+
 # ===============
 # = YamlOptions =
 # ===============
 
 class YamlOptions(UserDict.IterableUserDict):
-    """
-    TODO: add test with read YamlOptions
+    """Compiled routes (RoutePlan) of yaml files, indexed by URL
+
+    First file of yaml_list override others, yaml_default give default
+    values ('::dummy::' item). yaml_list can hold include directories
+    (see ConfigLayers). Parsed files are cached in cache_dir if set.
     """
 
-    def __init__(self, yaml_list, yaml_default, base_dir):
+    def __init__(self, yaml_list, yaml_default, base_dir, cache_dir=None,
+                 previous=None):
         # TODO: check no use of calling UserDict.IterableUserDict.__init__
         (UserDict.IterableUserDict).__init__(self)
-        self._yaml_list = yaml_list
-        self._yaml_default = yaml_default
-        self._base_dir = base_dir
+        self._layers = ConfigLayers(yaml_list, yaml_default, base_dir,
+                                    cache_dir)
+        if previous is not None:
+            # routes compiled before (ex: CompiledOptions), kept if
+            # unchanged
+            self.data = previous
 
         # do initial loading
         self.reload()
 
     def reload(self):
-        options = {}
-        for config_file in reversed(self._yaml_list):
-            options.update(get_config_from(config_file, self._base_dir))
-
-        # default value for each key (URL)
-        config_default = get_config_from(
-                            self._yaml_default, self._base_dir)['::dummy::']
-        config_forward_default = config_default['forwards'][0]
-        for (url_request, config_request) in options.items():
-            config_request['forwards'] = [
-                Chainmap(config_forward, config_forward_default)
-                for config_forward in config_request['forwards']]
-            options[url_request] = Chainmap(config_request, config_default)
-
-        self.data = options
+        """Load config files changed since last load
+
+        Only routes and forwards whose config (with default values)
+        changed are compiled again, others are kept with their state
+        (pools, caches...).
+
+        Returns:
+            True if config changed
+        """
+        try:
+            changed = self._layers.check()
+            if interpolator.changed():
+                # routes using changed secret are compiled again
+                changed = True
+            if not changed:
+                return False
+
+            # compiled once, request handling only read plans
+            data = compile_routes(self._layers.options,
+                                  self._layers.config_default, self.data)
+        except Exception:
+            # invalid config: current plans are kept, files are
+            # parsed again at next reload
+            self._layers.reset()
+            raise
+        # swap in one assignment, running requests keep their plans
+        self.data = data
+        return True
+
+    def paths(self):
+        """Paths of config files"""
+        return self._layers.paths()
+
+    def match(self, path):
+        """Find route of request path, see RouteIndex.match"""
+        return self.data.match(path)